@@ -11,18 +11,24 @@ import re
 import platform
 import subprocess
 
-from Push2Type.audio_capture import (
-    initialize_microphone,
-    start_audio_capture,
-    stop_and_flush_audio_capture,
-    shutdown_audio,
-)
-
-from Push2Type.transcription import (
-    load_model,
-    process_audio_data,
-    transcribe_audio,
-)
+from speech_backends import load_backend, real_time_factor
+from audio_stream import MicrophoneCapture, RingBufferCapture, StreamingTranscriber, open_audio
+from stage_timer import StageTimer
+from transcription_worker import TranscriptionWorker
+from dictation_log import DictationLog
+
+# -- Config --
+# "whisper" (float32 PyTorch) or "faster-whisper" (int8 CTranslate2). Check benchmark_transcription.py
+# on recorded commands before switching, it reports speed and accuracy of both
+TRANSCRIPTION_BACKEND = "whisper"
+WHISPER_MODEL = "small.en"
+TRANSCRIPTION_THREADS = 0  # 0 lets the backend pick
+# Transcribe while still recording, cutting the audio at pauses. Off until benchmark_transcription.py
+# --streaming shows it gets text out sooner on recorded commands without losing accuracy: Whisper pads
+# every chunk to 30s, so a short command cut at a pause costs two full decodes
+STREAMING_TRANSCRIPTION = False
+TRANSCRIPTION_QUEUE_SIZE = 4  # Recordings waiting to be transcribed before new ones are refused
+AUDIO_BUFFER_SECONDS = 120  # Longest recording kept in full when not streaming, longer ones keep their end
 
 @contextmanager
 def spinner(message="Processing", status_getter=None):
@@ -62,12 +68,19 @@ class AudioHandler:
         self.task_queue = task_queue
         self.is_recording = False
         self.logging_active = False
-        self.log_file = None
+        self.log = None  # DictationLog, opened the first time logging starts
         self.log_file_name = ""
-        self.log_count = 0
-
-        self.model = load_model("small.en", use_gpu=False)
-        initialize_microphone()
+        self.stream = None  # StreamingTranscriber of the current recording, if streaming
+
+        self.startup_timer = StageTimer()
+        with self.startup_timer.stage("model"):
+            self.transcriber = load_backend(TRANSCRIPTION_BACKEND, WHISPER_MODEL, threads=TRANSCRIPTION_THREADS)
+        with self.startup_timer.stage("microphone"):
+            # Device setup happens here once, recordings only open and close a stream
+            self.audio = open_audio()
+            # One buffer per queued job, plus the recording in progress and the one being transcribed
+            self.capture = RingBufferCapture(AUDIO_BUFFER_SECONDS, buffers=TRANSCRIPTION_QUEUE_SIZE + 2, audio=self.audio)
+        self.worker = TranscriptionWorker(max_pending=TRANSCRIPTION_QUEUE_SIZE)
 
         # Sound effects
         self.start_sound = "./sound effects/start.wav"
@@ -84,22 +97,82 @@ class AudioHandler:
 
     def _toggle_recording(self):
         if not self.is_recording:
+            if not self._can_record():
+                return
             with spinner("🎧  Recording started..."):
                 self._play_sound(self.start_sound)
-                start_audio_capture()
+                self._start_capture()
                 self.is_recording = True
         else:
             print("🛑  Recording stopped. Processing...")
             self._play_sound(self.stop_sound)
-            audio_bytes = stop_and_flush_audio_capture()
             self.is_recording = False
-            self._process_audio(audio_bytes)
-
-    def _process_audio(self, audio_bytes):
-        with spinner("Transcribing audio.. "):
-            audio_array = process_audio_data(audio_bytes)
-            text = transcribe_audio(audio_array, self.model)
-
+            self._submit(self._stop_capture(), self._process_text, "Transcribing audio.. ")
+
+    def _can_record(self) -> bool:
+        # Backpressure: don't take new audio while the transcription queue is full
+        if self.worker.is_full() or not self.capture.available():
+            print(f"⚠️  Still transcribing {self.worker.depth()} recordings, try again in a moment.")
+            self._play_sound(self.error_sound)
+            return False
+        return True
+
+    def _submit(self, transcribe, deliver, message):
+        def run():
+            with spinner(message):
+                return transcribe()
+
+        def handle(text):
+            print(
+                f"\r📬 Waited {self.worker.last_wait:.2f}s in the transcription queue, "
+                f"{self.worker.depth()} still queued"
+            )
+            deliver(text)
+
+        if not self.worker.submit(run, handle):
+            print("⚠️  Transcription queue is full, this recording was dropped.")
+            self._play_sound(self.error_sound)
+
+    def _start_capture(self):
+        if STREAMING_TRANSCRIPTION:
+            self.stream = StreamingTranscriber(self.transcriber, MicrophoneCapture(audio=self.audio))
+            self.stream.start()
+        else:
+            self.capture.start()
+
+    def _stop_capture(self):
+        # Stops capturing now and returns the job that produces the text, for the worker to run
+        if self.stream is None:
+            samples, buffer = self.capture.stop()
+
+            def transcribe():
+                try:
+                    return self._transcribe(samples)
+                finally:
+                    self.capture.release(buffer)
+            return transcribe
+
+        stream, self.stream = self.stream, None
+        stream.stop_capture()
+        stopped = time.perf_counter()
+
+        def finish():
+            text = stream.finish()
+            print(
+                f"\r⏱️ Text ready {time.perf_counter() - stopped:.2f}s after stopping, "
+                f"{stream.chunk_count} chunks transcribed"
+            )
+            return text
+        return finish
+
+    def _transcribe(self, audio_array) -> str:
+        start = time.perf_counter()
+        text = self.transcriber.transcribe(audio_array)
+        seconds = time.perf_counter() - start
+        print(f"\r⏱️ Transcribed in {seconds:.2f}s (real-time factor {real_time_factor(seconds, audio_array):.2f})")
+        return text
+
+    def _process_text(self, text):
         cleaned = re.sub(r'[^A-Za-z0-9]', '', text).lower().strip()
 
         if cleaned == "exit":
@@ -115,49 +188,36 @@ class AudioHandler:
 
     def _toggle_logging(self):
         if not self.logging_active:
+            if not self._can_record():
+                return
+
             os.makedirs("./logs", exist_ok=True)
             if not self.log_file_name:
                 timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
                 self.log_file_name = f"./logs/{timestamp}.txt"
 
-            self.log_file = open(self.log_file_name, "a", encoding="utf-8")
+            if self.log is None:
+                # Resumes from the sidecar index, plain-text logs get one built on first open
+                self.log = DictationLog(self.log_file_name)
             self.logging_active = True
-            self.log_count = 0
-            if os.path.exists(self.log_file_name):
-                with open(self.log_file_name, "r", encoding="utf-8") as f:
-                    for line in f:
-                        if line.strip() and line[0].isdigit():
-                            try:
-                                num = int(line.split()[0])
-                                self.log_count = max(self.log_count, num)
-                            except:
-                                continue
 
             print(f"🟢 Logging started. Speak your log now.")
             self._play_sound(self.start_sound)
-            start_audio_capture()
+            self._start_capture()
         else:
             print("🛑 Logging stopped. Transcribing and saving log...")
             self._play_sound(self.stop_sound)
-            audio_bytes = stop_and_flush_audio_capture()
             self.logging_active = False
+            self._submit(self._stop_capture(), self._write_log, "Transcribing your log entry...")
 
-            with spinner("Transcribing your log entry..."):
-                audio_array = process_audio_data(audio_bytes)
-                text = transcribe_audio(audio_array, self.model)
-
-            if not text.strip():
-                print("⚠️  No speech detected. Nothing written to log.\n")
-                return
+    def _write_log(self, text):
+        if not text.strip():
+            print("⚠️  No speech detected. Nothing written to log.\n")
+            return
 
-            print("📝 Logged:", text.strip())
+        print("📝 Logged:", text.strip())
 
-            self.log_count += 1
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            formatted = f"{self.log_count} [{timestamp}] - {text.strip()}"
-            if self.log_file:
-                self.log_file.write(formatted + "\n")
-                self.log_file.flush()
+        self.log.append(text.strip())
 
     def listen_for_audio(self):
         print("Press Ctrl + Alt + F to start/stop recording. Press Ctrl + Alt + G to toggle logging. Press ESC to exit.\n")
@@ -169,8 +229,10 @@ class AudioHandler:
 
     def _exit_program(self):
         print("Exiting...")
+        print(f"🧾 Transcriptions: {self.worker.summary()}")
         with spinner("Shutting down audio interface... "):
-            shutdown_audio()
-        if self.log_file:
-            self.log_file.close()
+            self.capture.close()
+            self.audio.terminate()
+        if self.log:
+            self.log.close()
         exit()
\ No newline at end of file
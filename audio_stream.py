@@ -0,0 +1,280 @@
+import threading
+import time
+import wave
+from queue import Empty, Queue
+import numpy as np
+
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # int16 mono
+FRAME_MS = 30
+
+
+def pcm_to_float(pcm: bytes):
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def open_audio():
+    # Sets up PortAudio and enumerates the devices, slow enough that it should happen once at startup
+    import pyaudio
+    return pyaudio.PyAudio()
+
+
+class MicrophoneCapture:
+    # 16 kHz mono int16 from the default microphone, read() hands over whatever arrived since the last call.
+    # With a sink, every callback's bytes go straight to sink(data) instead. Pass the open_audio() made
+    # at startup so a recording only opens a stream, without it every start() sets up PortAudio again
+    def __init__(self, frames_per_buffer: int = 1024, sink=None, audio=None):
+        self.frames_per_buffer = frames_per_buffer
+        self.sink = sink
+        self.shared_audio = audio
+        self.audio = None
+        self.stream = None
+        self.chunks = []
+        self.lock = threading.Lock()
+
+    def _callback(self, data, frame_count, time_info, status):
+        import pyaudio
+        if self.sink is not None:
+            self.sink(data)
+        else:
+            with self.lock:
+                self.chunks.append(data)
+        return None, pyaudio.paContinue
+
+    def start(self):
+        import pyaudio
+        self.audio = self.shared_audio or pyaudio.PyAudio()
+        self.stream = self.audio.open(
+            format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE, input=True,
+            frames_per_buffer=self.frames_per_buffer, stream_callback=self._callback,
+        )
+        self.stream.start_stream()
+
+    def read(self) -> bytes:
+        with self.lock:
+            data, self.chunks = b"".join(self.chunks), []
+        return data
+
+    def stop(self) -> bytes:
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.audio is not None and self.audio is not self.shared_audio:
+            self.audio.terminate()
+        self.audio = None
+        return self.read()
+
+
+class WavCapture:
+    # Plays a 16 kHz mono int16 WAV file as if it were being recorded, for trying the streaming path
+    # without a microphone. speed > 1 feeds it faster than real time
+    def __init__(self, path: str, speed: float = 1.0):
+        with wave.open(path, "rb") as wav:
+            if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != SAMPLE_WIDTH:
+                raise ValueError(f"{path} must be {SAMPLE_RATE} Hz mono 16-bit")
+            self.pcm = wav.readframes(wav.getnframes())
+        self.speed = speed
+        self.position = 0
+        self.started = None
+
+    def start(self):
+        self.position = 0
+        self.started = time.monotonic()
+
+    def read(self) -> bytes:
+        elapsed = (time.monotonic() - self.started) * self.speed
+        end = min(len(self.pcm), int(elapsed * SAMPLE_RATE) * SAMPLE_WIDTH)
+        data, self.position = self.pcm[self.position:end], max(self.position, end)
+        return data
+
+    def stop(self) -> bytes:
+        data, self.position = self.pcm[self.position:], len(self.pcm)
+        return data
+
+
+class RingBuffer:
+    # Preallocated float32 samples. Once a recording is longer than the buffer, the newest
+    # max_seconds survive
+    def __init__(self, max_seconds: float):
+        self.samples = np.zeros(int(max_seconds * SAMPLE_RATE), dtype=np.float32)
+        self.count = 0  # Samples written since reset()
+
+    def reset(self):
+        self.count = 0
+
+    def write_pcm(self, pcm: bytes):
+        # Converts int16 straight into the buffer, no intermediate float array
+        source = np.frombuffer(pcm, dtype=np.int16)
+        capacity = len(self.samples)
+        if len(source) > capacity:
+            self.count += len(source) - capacity
+            source = source[-capacity:]
+
+        position = self.count % capacity
+        first = min(len(source), capacity - position)
+        np.divide(source[:first], 32768.0, out=self.samples[position:position + first])
+        if first < len(source):
+            np.divide(source[first:], 32768.0, out=self.samples[:len(source) - first])
+        self.count += len(source)
+
+    def view(self):
+        # A view into the buffer, only copied (once) when the recording wrapped around
+        capacity = len(self.samples)
+        if self.count <= capacity:
+            return self.samples[:self.count]
+        start = self.count % capacity
+        return np.concatenate((self.samples[start:], self.samples[:start]))
+
+
+class RingBufferCapture:
+    # Microphone capture into a fixed pool of preallocated ring buffers, so memory has a ceiling of
+    # buffers * max_seconds no matter how long anyone talks. stop() hands out a float32 view of the
+    # recording without copying, its buffer stays reserved until release()
+    def __init__(self, max_seconds: float = 120, buffers: int = 2, audio=None):
+        self.free = Queue()
+        for _ in range(buffers):
+            self.free.put(RingBuffer(max_seconds))
+        self.current = None
+        self.microphone = MicrophoneCapture(audio=audio)
+        self.recording = False
+
+    def available(self) -> bool:
+        return not self.free.empty()
+
+    def start(self) -> bool:
+        try:
+            self.current = self.free.get_nowait()
+        except Empty:
+            return False
+        self.current.reset()
+        self.microphone.sink = self.current.write_pcm
+        self.microphone.start()
+        self.recording = True
+        return True
+
+    def stop(self):
+        # Returns (samples, buffer), pass the buffer to release() once the samples aren't needed anymore
+        self.microphone.stop()
+        self.recording = False
+        buffer, self.current = self.current, None
+        return buffer.view(), buffer
+
+    def release(self, buffer: RingBuffer):
+        self.free.put(buffer)
+
+    def close(self):
+        if self.recording:
+            self.microphone.stop()
+            self.recording = False
+
+
+class VadChunker:
+    # Energy-based voice activity detection. Cuts the stream into chunks that end in a pause,
+    # so each chunk can be transcribed on its own without splitting a word
+    def __init__(self, silence_ms: int = 400, min_chunk_ms: int = 1000, max_chunk_ms: int = 10000,
+                 threshold: float = 0.01):
+        self.frame_bytes = SAMPLE_RATE * FRAME_MS // 1000 * SAMPLE_WIDTH
+        self.silence_frames = silence_ms // FRAME_MS
+        self.min_frames = min_chunk_ms // FRAME_MS
+        self.max_frames = max_chunk_ms // FRAME_MS
+        self.threshold = threshold
+
+        self.pending = b""   # Bytes not yet making up a whole frame
+        self.frames = []     # Frames of the chunk being built
+        self.heard_speech = False
+        self.quiet_frames = 0
+
+    def feed(self, pcm: bytes):
+        chunks = []
+        data = self.pending + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self.pending = data[usable:]
+
+        for offset in range(0, usable, self.frame_bytes):
+            frame = data[offset:offset + self.frame_bytes]
+            self.frames.append(frame)
+
+            rms = float(np.sqrt(np.mean(pcm_to_float(frame) ** 2)))
+            if rms >= self.threshold:
+                self.heard_speech = True
+                self.quiet_frames = 0
+            else:
+                self.quiet_frames += 1
+
+            paused = self.heard_speech and self.quiet_frames >= self.silence_frames
+            if (paused and len(self.frames) >= self.min_frames) or len(self.frames) >= self.max_frames:
+                chunk = self._take()
+                if chunk is not None:
+                    chunks.append(chunk)
+        return chunks
+
+    def flush(self):
+        # Whatever is left when recording stops
+        self.frames.append(self.pending)
+        self.pending = b""
+        return self._take()
+
+    def _take(self):
+        chunk, heard = b"".join(self.frames), self.heard_speech
+        self.frames = []
+        self.heard_speech = False
+        self.quiet_frames = 0
+        # Pure silence would only give the model a chance to hallucinate
+        return chunk if heard and chunk else None
+
+
+class StreamingTranscriber:
+    # Transcribes speech-delimited chunks in the background while recording, so that stopping
+    # only leaves the last chunk to transcribe
+    def __init__(self, transcriber, source, chunker=None, poll_interval: float = 0.05):
+        self.transcriber = transcriber
+        self.source = source
+        self.chunker = chunker or VadChunker()
+        self.poll_interval = poll_interval
+
+        self.parts = []
+        self.chunk_count = 0
+        self.running = False
+        self.thread = None
+        self.remaining = b""
+
+    def start(self):
+        self.parts = []
+        self.chunk_count = 0
+        self.running = True
+        self.source.start()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            for chunk in self.chunker.feed(self.source.read()):
+                self._transcribe(chunk)
+            time.sleep(self.poll_interval)
+
+    def _transcribe(self, chunk: bytes):
+        self.chunk_count += 1
+        text = self.transcriber.transcribe(pcm_to_float(chunk)).strip()
+        if text:
+            self.parts.append(text)
+
+    def stop_capture(self):
+        # Releases the microphone right away, finish() does the remaining transcription
+        self.running = False
+        self.remaining = self.source.stop()
+
+    def finish(self) -> str:
+        # Waits for the chunk in progress, so the last read goes through in order before the tail
+        self.thread.join()
+        for chunk in self.chunker.feed(self.remaining):
+            self._transcribe(chunk)
+        tail = self.chunker.flush()
+        if tail is not None:
+            self._transcribe(tail)
+        return " ".join(self.parts)
+
+    def stop(self) -> str:
+        self.stop_capture()
+        return self.finish()
@@ -0,0 +1,41 @@
+import sys
+import time
+from benchmark_selectors import synthetic_page
+from fake_driver import FakeDriver, offline_parser
+from llm_command_parser import DOM_SERIALIZERS
+from llm_handler import count_tokens, get_tokenizer
+
+
+# Times each DOM serializer on the same parsed snapshot and counts the tokens it produces, on
+# synthetic list pages plus any saved pages passed in:
+#   python benchmark_dom_formats.py [saved_page.html ...]
+
+SYNTHETIC_ROWS = (100, 1000, 5000)
+REPEATS = 5
+
+
+def benchmark(label: str, html: str):
+    built = offline_parser(FakeDriver(html))._parse_page_source(html)
+    print(f"{label}: {len(built['tags'])} elements")
+
+    results = {}
+    for dom_format, serialize in DOM_SERIALIZERS.items():
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            text = serialize(built["root"])
+        seconds = (time.perf_counter() - start) / REPEATS
+        results[dom_format] = count_tokens(text)
+        print(f"   {dom_format}: {seconds * 1000:.1f}ms, {len(text)} chars, {results[dom_format]} tokens")
+
+    if "json" in results and "compact" in results:
+        print(f"   compact is {1 - results['compact'] / max(results['json'], 1):.0%} fewer tokens than json")
+
+
+if __name__ == "__main__":
+    if get_tokenizer() is None:
+        print("⚠️  tiktoken isn't available, token counts are estimated as chars / 4")
+    for rows in SYNTHETIC_ROWS:
+        benchmark(f"synthetic {rows} rows", synthetic_page(rows))
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8") as f:
+            benchmark(path, f.read())
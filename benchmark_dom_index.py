@@ -0,0 +1,49 @@
+import sys
+import time
+from benchmark_selectors import synthetic_page
+from fake_driver import FakeDriver, offline_parser
+
+
+# Times building the relevance index over a snapshot and querying it, on synthetic list pages plus
+# any saved pages passed in:
+#   python benchmark_dom_index.py [saved_page.html ...]
+
+SYNTHETIC_ROWS = (300, 1000, 5000)
+TOP_K = 60
+QUERIES = ("click upload", "search for slices", "show notes", "open volume 731", "open the third volume")
+QUERY_REPEATS = 20
+
+
+def benchmark(label: str, html: str):
+    parser = offline_parser(FakeDriver(html), top_k=TOP_K)
+    built = parser._parse_page_source(html)
+
+    start = time.perf_counter()
+    index = parser.element_index(built)
+    build_seconds = time.perf_counter() - start
+    print(f"{label}: {len(built['tags'])} elements, index of {len(index)} built in {build_seconds * 1000:.1f}ms")
+
+    for query in QUERIES:
+        start = time.perf_counter()
+        for _ in range(QUERY_REPEATS):
+            index.search(query, TOP_K)
+        search_seconds = (time.perf_counter() - start) / QUERY_REPEATS
+
+        start = time.perf_counter()
+        for _ in range(QUERY_REPEATS):
+            kept = parser.relevant_elements(built, query, TOP_K)
+        expand_seconds = (time.perf_counter() - start) / QUERY_REPEATS
+
+        parser._render_snapshot(built, query=query)
+        sent = parser.last_relevant_count
+        sent = f"{sent} elements sent" if sent is not None else "full snapshot sent"
+        print(f"   {query!r}: search {search_seconds * 1000:.2f}ms, with context {expand_seconds * 1000:.2f}ms "
+              f"({len(kept)} kept), {sent}")
+
+
+if __name__ == "__main__":
+    for rows in SYNTHETIC_ROWS:
+        benchmark(f"synthetic {rows} rows", synthetic_page(rows))
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8") as f:
+            benchmark(path, f.read())
@@ -0,0 +1,62 @@
+import time
+import tracemalloc
+import numpy as np
+from audio_handler import AUDIO_BUFFER_SECONDS
+from audio_stream import SAMPLE_RATE, RingBuffer, pcm_to_float
+
+
+# Times the capture-to-transcription handoff of 5 s, 30 s and 120 s recordings on synthetic PCM, for
+# the ring buffer and for the old path (collect bytes chunks, join them, convert to a new float
+# array). Needs no microphone:
+#   python benchmark_ring_buffer.py
+
+RECORDING_SECONDS = (5, 30, 120)
+FRAMES_PER_BUFFER = 1024  # Bytes per microphone callback are twice this
+
+
+def callbacks(seconds: int):
+    pcm = np.random.default_rng(seconds).integers(-20000, 20000, seconds * SAMPLE_RATE, dtype=np.int16).tobytes()
+    step = FRAMES_PER_BUFFER * 2
+    return [pcm[i:i + step] for i in range(0, len(pcm), step)]
+
+
+def measure(function):
+    # (result, seconds, peak bytes allocated while it ran)
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def old_path(chunks):
+    collected = []
+    for data in chunks:
+        collected.append(data)
+    return pcm_to_float(b"".join(collected))
+
+
+if __name__ == "__main__":
+    buffer, allocate_seconds, allocate_bytes = measure(lambda: RingBuffer(AUDIO_BUFFER_SECONDS))
+    print(f"Ring buffer of {AUDIO_BUFFER_SECONDS}s allocated once at startup: "
+          f"{allocate_seconds * 1000:.2f}ms, {allocate_bytes / 2**20:.1f} MiB")
+
+    for seconds in RECORDING_SECONDS:
+        chunks = callbacks(seconds)
+
+        old_samples, old_seconds, old_peak = measure(lambda: old_path(chunks))
+
+        buffer.reset()
+        _, capture_seconds, capture_peak = measure(lambda: [buffer.write_pcm(data) for data in chunks])
+        samples, handoff_seconds, handoff_peak = measure(buffer.view)
+
+        identical = np.array_equal(samples, old_samples)
+        copied = "copied" if not np.shares_memory(samples, buffer.samples) else "no copy"
+        print(
+            f"{seconds:>4}s: old join+convert {old_seconds * 1000:.2f}ms, {old_peak / 2**20:.1f} MiB | "
+            f"ring buffer writes {capture_seconds * 1000:.2f}ms, {capture_peak / 2**20:.2f} MiB, "
+            f"handoff {handoff_seconds * 1000:.3f}ms ({copied}), {handoff_peak / 2**20:.2f} MiB | "
+            f"{'✅ same samples' if identical else '❌ samples differ'}"
+        )
@@ -0,0 +1,126 @@
+import random
+import sys
+import time
+from bs4 import BeautifulSoup, Tag
+from llm_command_parser import ESSENTIAL_ATTRIBUTES, ESSENTIAL_CONTENT_TAGS, LLMCommandParser
+
+
+# Checks that the single-pass selector/idx assignment gives exactly what the original per-element
+# walk gave, and times both. Runs on synthetic list pages, plus any saved HTML pages passed in:
+#   python benchmark_selectors.py [saved_page.html ...]
+
+SYNTHETIC_ROWS = (100, 1000, 5000)
+
+
+def synthetic_page(rows: int, seed: int = 0) -> str:
+    # A dataset list page: toolbar, nested wrappers, rows mixing id/class/bare elements and some
+    # tags that get pruned, so every selector_part branch is exercised
+    rng = random.Random(seed)
+    parts = ['<html><head><style>.x{}</style></head><body><div class="app">',
+             '<nav class="toolbar"><button class="el-button">Upload</button><input type="text" placeholder="Search"></nav>',
+             '<div class="list-wrapper">']
+    for i in range(rows):
+        kind = rng.randrange(4)
+        if kind == 0:
+            parts.append(f'<div id="row-{i}" class="row"><span>Volume {i}</span><i class="mdi mdi-eye"></i></div>')
+        elif kind == 1:
+            parts.append(f'<div class="row"><span class="name">Volume {i}</span><span>{rng.randrange(512)} slices</span></div>')
+        elif kind == 2:
+            parts.append(f'<div><span>Volume {i}</span><svg><path></path></svg><a href="/v/{i}">Open</a></div>')
+        else:
+            parts.append(f'<li><p>Volume {i}</p><p><b>ignored</b> <span class=" ">notes</span></p></li>')
+    parts.append('</div></div><script>var x = 1;</script></body></html>')
+    return "".join(parts)
+
+
+def legacy_selectors(html: str):
+    # The original page_source_parser: walk to the root for every element, sibling lists rebuilt each time
+    soup = BeautifulSoup(html, "html.parser")
+
+    def prune_element(el: Tag):
+        for child in list(el.contents):
+            if isinstance(child, Tag):
+                if child.name not in ESSENTIAL_CONTENT_TAGS:
+                    child.decompose()
+                else:
+                    prune_element(child)
+        el.attrs = {k: v for k, v in el.attrs.items() if k in ESSENTIAL_ATTRIBUTES}
+
+    for tag in soup(["script", "style"]):
+        tag.decompose()
+    prune_element(soup.body)
+
+    def build_selector(el: Tag):
+        parts = []
+        while el and el.name != '[document]':
+            part = el.name
+            if el.has_attr('id'):
+                part += f"#{el['id']}"
+            elif el.has_attr('class'):
+                classes = [cls for cls in el['class'] if cls.strip()]
+                if classes:
+                    part += '.' + '.'.join(classes)
+            else:
+                if el.parent:
+                    siblings = [sib for sib in el.parent.find_all(el.name, recursive=False)]
+                    index = siblings.index(el) + 1
+                    part += f":nth-of-type({index})"
+            parts.insert(0, part)
+            el = el.parent
+        return ' > '.join(parts)
+
+    selectors, idx = [], []
+
+    def assign_element_ids(el: Tag):
+        selectors.append(build_selector(el))
+        if el.parent:
+            all_element_siblings = [c for c in el.parent.contents if isinstance(c, Tag)]
+            idx.append(str(all_element_siblings.index(el) + 1))
+        for child in el.children:
+            if isinstance(child, Tag):
+                assign_element_ids(child)
+
+    assign_element_ids(soup.body)
+    return selectors, idx
+
+
+def current_selectors(html: str):
+    # Parser without a browser, only the parsing half is used
+    parser = LLMCommandParser.__new__(LLMCommandParser)
+    parser.snapshot_token = 0
+    parser.reset_snapshot()
+    built = parser._parse_page_source(html)
+    # Element IDs are handed out in document order on a fresh parser, like the old counter
+    selectors = [built["selector_map"][element_id] for element_id in sorted(built["selector_map"])]
+    idx = [el["idx"] for el in built["tags"].values()]
+    return selectors, idx
+
+
+def timed(function, html: str):
+    start = time.perf_counter()
+    result = function(html)
+    return result, time.perf_counter() - start
+
+
+def compare(label: str, html: str) -> bool:
+    (old_selectors, old_idx), old_seconds = timed(legacy_selectors, html)
+    (new_selectors, new_idx), new_seconds = timed(current_selectors, html)
+
+    identical = old_selectors == new_selectors and old_idx == new_idx
+    status = "✅ identical" if identical else "❌ DIFFERENT"
+    print(f"{label}: {len(new_selectors)} elements, {status}, "
+          f"old {old_seconds:.3f}s, new {new_seconds:.3f}s ({old_seconds / max(new_seconds, 1e-9):.1f}x)")
+    if not identical:
+        for position, (old, new) in enumerate(zip(old_selectors, new_selectors)):
+            if old != new:
+                print(f"   first difference at element {position}:\n   old {old}\n   new {new}")
+                break
+    return identical
+
+
+if __name__ == "__main__":
+    results = [compare(f"synthetic {rows} rows", synthetic_page(rows)) for rows in SYNTHETIC_ROWS]
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8") as f:
+            results.append(compare(path, f.read()))
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,101 @@
+import random
+import sys
+import time
+from benchmark_selectors import synthetic_page
+from fake_driver import FakeDriver, offline_parser
+from llm_handler import (
+    COMMAND_RESULT_CHARS, PROMPT_BUDGET, PROMPT_HISTORY_WINDOW, SessionHistory, assemble_prompt, build_prompt,
+    compact_command, count_tokens, fit_prompt_sections, get_tokenizer,
+)
+
+
+# Runs a long synthetic session through the prompt building of llm_handler.main, with the bounded
+# history and section budgets, next to the old unbounded history, and reports prompt tokens and
+# build time per step:
+#   python benchmark_session_history.py [commands]
+
+SESSION_COMMANDS = 500
+PRINT_EVERY = 50
+DOM_ROWS = 300
+URL = "https://app.supervisely.com/projects/1/datasets"
+
+TEMPLATES = [
+    "increase {scan} by {n}", "go to slide {n} on {scan}", "zoom {direction} {z}x on {scan}",
+    "fullscreen {scan}", "open volume {n}", "search for volume {n} and open it",
+    "extract the notes of volume {n}", "reset zoom on {scan}",
+]
+
+
+def synthetic_session(count: int, seed: int = 0):
+    # (request, the actions it ran with their results) for every step
+    rng = random.Random(seed)
+    session = []
+    for _ in range(count):
+        request = rng.choice(TEMPLATES).format(
+            scan=rng.choice(["axial", "sagittal", "coronal"]), n=rng.randrange(1, 400),
+            direction=rng.choice(["top left", "bottom right", "center"]), z=rng.choice([1.5, 2, 3]),
+        )
+        actions = [({"action": "click", "element_id": rng.randrange(900), "intend": "Open the volume"},
+                    "Command executed successfully")]
+        if request.startswith("extract"):
+            # Extracted text is the long kind of result
+            actions.append(({"action": "extract", "element_id": rng.randrange(900), "intend": "Read the notes"},
+                            " ".join(f"note{rng.randrange(10**6)}" for _ in range(300))))
+        session.append((request, actions))
+    return session
+
+
+def build_step(request, commands, dom, history, bounded: bool):
+    # The prompt of a task's first model call after its actions so far, as llm_handler.main builds it
+    if bounded:
+        history.add(request)
+        prompt_history, command_history, page_data, _ = fit_prompt_sections(
+            history.for_prompt(), commands, dom, user_request=request, dom_format="compact"
+        )
+    else:
+        history.append(request)
+        prompt_history, command_history, page_data = list(history), commands, dom
+    prompt = build_prompt(prompt_history, command_history, URL, page_data, user_request=request)
+    messages, stats = assemble_prompt([{"role": "user", "content": prompt}], dom_format="compact")
+    return stats["total_tokens"]
+
+
+def run(session, dom, bounded: bool):
+    history = SessionHistory(window=PROMPT_HISTORY_WINDOW) if bounded else []
+    steps = []
+    for request, actions in session:
+        if bounded:
+            commands = [compact_command(action, result, COMMAND_RESULT_CHARS) for action, result in actions]
+        else:
+            commands = [{"command": action, "result": result} for action, result in actions]
+        start = time.perf_counter()
+        tokens = build_step(request, commands, dom, history, bounded)
+        steps.append((tokens, time.perf_counter() - start))
+    return steps
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else SESSION_COMMANDS
+    if get_tokenizer() is None:
+        print("⚠️  tiktoken isn't available, token counts are estimated as chars / 4")
+
+    html = synthetic_page(DOM_ROWS)
+    parser = offline_parser(FakeDriver(html))
+    dom = parser.capture_dom()
+    print(f"{count} commands on a {DOM_ROWS} row page ({count_tokens(dom)} DOM tokens), budget {PROMPT_BUDGET}")
+
+    session = synthetic_session(count)
+    bounded = run(session, dom, bounded=True)
+    unbounded = run(session, dom, bounded=False)
+
+    print(f"{'step':>6} {'bounded tokens':>15} {'build ms':>9} {'unbounded tokens':>17} {'build ms':>9}")
+    for step in range(count):
+        if step % PRINT_EVERY == 0 or step == count - 1:
+            (tokens, seconds), (old_tokens, old_seconds) = bounded[step], unbounded[step]
+            print(f"{step + 1:>6} {tokens:>15} {seconds * 1000:>9.2f} {old_tokens:>17} {old_seconds * 1000:>9.2f}")
+
+    for label, steps in (("bounded", bounded), ("unbounded", unbounded)):
+        tokens = [t for t, _ in steps]
+        seconds = [s for _, s in steps]
+        print(f"{label}: prompt {min(tokens)}-{max(tokens)} tokens, last {tokens[-1]}, "
+              f"build {sum(seconds) / len(seconds) * 1000:.2f}ms mean, {max(seconds) * 1000:.2f}ms max")
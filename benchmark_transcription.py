@@ -0,0 +1,169 @@
+import glob
+import os
+import re
+import sys
+import time
+import wave
+from audio_handler import TRANSCRIPTION_THREADS, WHISPER_MODEL
+from audio_stream import SAMPLE_RATE, SAMPLE_WIDTH, StreamingTranscriber, WavCapture, pcm_to_float
+from command_router import CommandRouter
+from speech_backends import load_backend, real_time_factor
+
+
+# Compares the transcription backends on recorded command clips: real-time factor, and word error
+# rate against a reference transcript. Clips are 16 kHz mono 16-bit WAV files, each with its
+# reference next to it as a .txt file of the same name (clips without one only get timed):
+#   python benchmark_transcription.py clips_dir [model] [--streaming]
+# "whisper" is the current float32 path, the others are measured against it. With --streaming, every
+# clip is also played in real time through the streaming path (STREAMING_TRANSCRIPTION) and its
+# time-to-text after the recording stops is compared with one pass
+
+BACKENDS = ("whisper", "faster-whisper")
+# A backend counts as on par when its WER is at most this much above the current path's
+WER_PARITY_MARGIN = 0.02
+
+
+def normalize(text: str):
+    # Case and punctuation don't count, and "thirty" is the same word as "30"
+    return CommandRouter()._join_numbers(re.findall(r"[a-z0-9']+", text.lower()))
+
+
+def word_errors(reference: str, hypothesis: str):
+    # (substitutions + insertions + deletions, reference length) by word-level edit distance
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def load_clips(directory: str):
+    clips = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        with wave.open(path, "rb") as wav:
+            if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != SAMPLE_WIDTH:
+                print(f"⚠️  Skipping {path}, it must be {SAMPLE_RATE} Hz mono 16-bit")
+                continue
+            audio = pcm_to_float(wav.readframes(wav.getnframes()))
+
+        reference = None
+        reference_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(reference_path):
+            with open(reference_path, "r", encoding="utf-8") as f:
+                reference = f.read().strip()
+        clips.append((os.path.basename(path), audio, reference))
+    return clips
+
+
+def run_backend(name: str, model_name: str, clips):
+    try:
+        backend = load_backend(name, model_name, TRANSCRIPTION_THREADS, warm_up=True)
+    except ImportError as e:
+        print(f"⚠️  {name} isn't installed ({e}), skipping it")
+        return None
+    if backend.name != name:
+        print(f"⚠️  {name} isn't available, skipping it")
+        return None
+
+    results = {}
+    for clip, audio, reference in clips:
+        start = time.perf_counter()
+        text = backend.transcribe(audio)
+        seconds = time.perf_counter() - start
+        results[clip] = {"text": text, "seconds": seconds, "rtf": real_time_factor(seconds, audio)}
+        print(f"   {name} {clip}: {seconds:.2f}s (RTF {results[clip]['rtf']:.2f}) {text!r}")
+    return results
+
+
+def run_streaming(name: str, model_name: str, directory: str, clips):
+    # (one-pass results, streaming results), time-to-text counts from the moment recording stops
+    backend = load_backend(name, model_name, TRANSCRIPTION_THREADS, warm_up=True)
+    one_pass, streaming = {}, {}
+    for clip, audio, _ in clips:
+        start = time.perf_counter()
+        text = backend.transcribe(audio)
+        one_pass[clip] = {"text": text, "seconds": time.perf_counter() - start}
+
+        stream = StreamingTranscriber(backend, WavCapture(os.path.join(directory, clip)))
+        stream.start()
+        time.sleep(len(audio) / SAMPLE_RATE)
+        start = time.perf_counter()
+        text = stream.stop()
+        streaming[clip] = {"text": text, "seconds": time.perf_counter() - start, "chunks": stream.chunk_count}
+        print(f"   {clip}: one pass {one_pass[clip]['seconds']:.2f}s, streaming {streaming[clip]['seconds']:.2f}s "
+              f"after stopping ({stream.chunk_count} chunks) {text!r}")
+    return one_pass, streaming
+
+
+def summarize(name: str, results, clips, baseline=None):
+    audio_seconds = sum(len(audio) for _, audio, _ in clips) / SAMPLE_RATE
+    seconds = sum(result["seconds"] for result in results.values())
+    line = f"{name}: RTF {seconds / audio_seconds:.3f} over {audio_seconds:.1f}s of audio"
+
+    errors = words = 0
+    for clip, _, reference in clips:
+        if reference is not None:
+            clip_errors, clip_words = word_errors(reference, results[clip]["text"])
+            errors += clip_errors
+            words += clip_words
+    wer = errors / words if words else None
+    if wer is not None:
+        line += f", WER {wer:.1%} on {words} reference words"
+
+    if baseline is not None:
+        changed = sum(word_errors(baseline[clip]["text"], results[clip]["text"])[0] for clip in results)
+        baseline_words = sum(len(normalize(baseline[clip]["text"])) for clip in results)
+        line += f", {changed / max(baseline_words, 1):.1%} of words differ from the current path"
+    print(line)
+    return wer
+
+
+if __name__ == "__main__":
+    streaming = "--streaming" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != "--streaming"]
+    if not args:
+        print("Usage: python benchmark_transcription.py clips_dir [model] [--streaming]")
+        sys.exit(2)
+    model_name = args[1] if len(args) > 1 else WHISPER_MODEL
+    clips = load_clips(args[0])
+    if not clips:
+        print(f"No usable .wav clips in {args[0]}")
+        sys.exit(2)
+
+    results = {}
+    for name in BACKENDS:
+        print(f"🎙️ {name} ({model_name})")
+        results[name] = run_backend(name, model_name, clips)
+
+    print()
+    baseline = results[BACKENDS[0]]
+    baseline_wer = summarize(BACKENDS[0], baseline, clips) if baseline else None
+    on_par = True
+    for name in BACKENDS[1:]:
+        if results[name] is None:
+            continue
+        wer = summarize(name, results[name], clips, baseline)
+        if wer is not None and baseline_wer is not None:
+            if wer > baseline_wer + WER_PARITY_MARGIN:
+                on_par = False
+                print(f"❌ {name} is less accurate than the current path ({wer:.1%} vs {baseline_wer:.1%} WER)")
+            else:
+                print(f"✅ {name} is on par with the current path ({wer:.1%} vs {baseline_wer:.1%} WER)")
+
+    if streaming:
+        print(f"\n🎙️ streaming vs one pass ({BACKENDS[0]}, {model_name})")
+        one_pass, streamed = run_streaming(BACKENDS[0], model_name, args[0], clips)
+        one_pass_wer = summarize("one pass", one_pass, clips)
+        streaming_wer = summarize("streaming", streamed, clips, one_pass)
+        one_pass_seconds = sum(result["seconds"] for result in one_pass.values()) / len(clips)
+        streaming_seconds = sum(result["seconds"] for result in streamed.values()) / len(clips)
+        faster = streaming_seconds < one_pass_seconds
+        accurate = one_pass_wer is None or streaming_wer <= one_pass_wer + WER_PARITY_MARGIN
+        print(f"{'✅' if faster and accurate else '❌'} streaming: text {streaming_seconds:.2f}s after stopping "
+              f"vs {one_pass_seconds:.2f}s in one pass"
+              + (f", {streaming_wer:.1%} vs {one_pass_wer:.1%} WER" if one_pass_wer is not None else ""))
+        on_par = on_par and faster and accurate
+    sys.exit(0 if on_par else 1)
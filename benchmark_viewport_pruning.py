@@ -0,0 +1,45 @@
+import sys
+from benchmark_selectors import synthetic_page
+from fake_driver import FakeDriver, offline_parser
+from llm_command_parser import DOM_SERIALIZERS
+from llm_handler import count_tokens, get_tokenizer
+
+
+# Reports how much viewport pruning takes off full snapshots: elements sent, hidden and collapsed,
+# and the characters and tokens of the pruned render against the full one, at the top of the page
+# and scrolled to its middle. Runs on synthetic list pages plus any saved pages passed in:
+#   python benchmark_viewport_pruning.py [saved_page.html ...]
+
+SYNTHETIC_ROWS = (300, 2000)
+VIEWPORT = (1280, 800)
+
+
+def report(label: str, html: str):
+    driver = FakeDriver(html, viewport=VIEWPORT)
+    scroll_positions = {"top": 0, "middle": len(driver.positions) * 20 // 2}
+    for dom_format in DOM_SERIALIZERS:
+        parser = offline_parser(driver, dom_format=dom_format, viewport_pruning=True)
+        for position, scroll_y in scroll_positions.items():
+            driver.scroll_y = scroll_y
+            parser.reset_snapshot()
+            pruned = parser.capture_dom()
+            full = DOM_SERIALIZERS[dom_format](parser.current_snapshot["root"])
+            stats = parser.last_viewport_stats
+            full_tokens, pruned_tokens = count_tokens(full), count_tokens(pruned)
+            lines = f", {len(pruned.splitlines())} lines" if dom_format == "compact" else ""
+            print(
+                f"{label} {dom_format} @ {position}: {stats['sent']} of {stats['elements']} elements sent, "
+                f"{stats['hidden']} hidden, {stats['collapsed']} collapsed{lines} | "
+                f"{len(full)} -> {len(pruned)} chars, {full_tokens} -> {pruned_tokens} tokens "
+                f"({1 - pruned_tokens / max(full_tokens, 1):.0%} fewer)"
+            )
+
+
+if __name__ == "__main__":
+    if get_tokenizer() is None:
+        print("⚠️  tiktoken isn't available, token counts are estimated as chars / 4")
+    for rows in SYNTHETIC_ROWS:
+        report(f"synthetic {rows} rows", synthetic_page(rows))
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8") as f:
+            report(path, f.read())
@@ -0,0 +1,255 @@
+import difflib
+import re
+import time
+
+
+SCAN_NAMES = ["Axial", "Sagittal", "Coronal"]
+
+ZOOM_DIRECTIONS = [
+    "top left", "top right", "bottom left", "bottom right",
+    "center", "center top", "center bottom",
+    "middle left", "middle right",
+]
+
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+    "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70,
+    "eighty": 80, "ninety": 90,
+}
+
+# Transcription variants mapped onto the words the grammar understands
+WORD_ALIASES = {
+    "full-screen": "fullscreen", "centre": "center", "upper": "top", "lower": "bottom",
+    "slices": "slide", "slice": "slide", "slides": "slide", "sides": "slide",
+    "times": "x", "increased": "increase", "decreased": "decrease",
+}
+
+# Words that may appear around a command without changing its meaning
+FILLER_WORDS = {
+    "please", "the", "a", "an", "scan", "slider", "slide", "view", "image", "on", "in", "of",
+    "at", "and", "now", "can", "you", "it", "that", "this", "number", "mode", "window", "pane",
+}
+
+# Words that may sit between a speed and "per second", e.g. "3 slides per second", "slider per second 3"
+SPEED_WORDS = {"slide", "slider", "speed", "at", "of", "is"}
+
+INCREASE_WORDS = {"increase", "forward", "next", "up", "raise", "add"}
+DECREASE_WORDS = {"decrease", "back", "backward", "previous", "down", "reduce"}
+ABSOLUTE_WORDS = {"go", "set", "jump", "move", "goto"}
+# "by 10" is a step and "to 10" a position, whatever the verb says
+RELATIVE_MARKERS = {"by"}
+ABSOLUTE_MARKERS = {"to"}
+
+
+class CommandRouter:
+    # Turns plain viewer commands into actions without a DOM snapshot or a model round trip.
+    # route() returns None whenever a command has anything it doesn't understand
+    def __init__(self, scan_cutoff: float = 0.7):
+        self.scan_cutoff = scan_cutoff
+        self.stats = {"commands": 0, "routed": 0, "seconds": 0.0}
+        self.last_seconds = 0.0
+
+    def served_fraction(self) -> float:
+        if not self.stats["commands"]:
+            return 0.0
+        return self.stats["routed"] / self.stats["commands"]
+
+    def route(self, text: str, current_scan: str = ""):
+        start = time.perf_counter()
+        actions = self._route(text, current_scan or "")
+        self.last_seconds = time.perf_counter() - start
+        self.stats["commands"] += 1
+        if actions is not None:
+            self.stats["routed"] += 1
+            self.stats["seconds"] += self.last_seconds
+        return actions
+
+    def _route(self, text: str, current_scan: str):
+        tokens = self._tokenize(text)
+        if not tokens:
+            return None
+
+        scan, tokens = self._take_scan(tokens)
+        if not scan and current_scan:
+            scan, _ = self._take_scan([current_scan.lower()])
+
+        if "fullscreen" in tokens or ("full" in tokens and "screen" in tokens):
+            return self._fullscreen(self._words(tokens), scan)
+        if "zoom" in tokens:
+            return self._zoom(self._words(tokens), scan)
+        return self._slider(tokens, scan)
+
+    def _tokenize(self, text: str):
+        # Commas stay in as "," tokens, they keep "twenty five, three" apart and separate the
+        # clauses of "by 20, slider per second 3"
+        text = text.lower()
+        text = re.sub(r"(\d+(?:\.\d+)?)x\b", r"\1 x", text)
+        words = re.findall(r"\d+(?:\.\d+)?|[a-z]+(?:-[a-z]+)?|[,;]", text)
+        words = [WORD_ALIASES.get(word, word) for word in words]
+        return ["," if token == ";" else token for token in self._join_numbers(words)]
+
+    def _words(self, tokens):
+        return [token for token in tokens if token != ","]
+
+    def _join_numbers(self, words):
+        # "one hundred fifty" -> 150, "twenty five" -> 25, "one point five" -> 1.5
+        tokens = []
+        i = 0
+        while i < len(words):
+            if words[i] not in NUMBER_WORDS and words[i] != "hundred":
+                tokens.append(words[i])
+                i += 1
+                continue
+
+            value = 0
+            current = 0
+            while i < len(words) and (words[i] in NUMBER_WORDS or words[i] == "hundred"):
+                if words[i] == "hundred":
+                    current = max(current, 1) * 100
+                else:
+                    current += NUMBER_WORDS[words[i]]
+                i += 1
+            value += current
+
+            if i + 1 < len(words) and words[i] == "point" and words[i + 1] in NUMBER_WORDS:
+                tokens.append(f"{value}.{NUMBER_WORDS[words[i + 1]]}")
+                i += 2
+            else:
+                tokens.append(str(value))
+        return tokens
+
+    def _take_scan(self, tokens):
+        lowered = [name.lower() for name in SCAN_NAMES]
+        for i, token in enumerate(tokens):
+            if not token.isalpha() or len(token) < 4:
+                continue
+            match = difflib.get_close_matches(token, lowered, n=1, cutoff=self.scan_cutoff)
+            if match:
+                return match[0].capitalize(), tokens[:i] + tokens[i + 1:]
+        return "", tokens
+
+    def _numbers(self, tokens):
+        return [float(token) for token in tokens if re.fullmatch(r"\d+(?:\.\d+)?", token)]
+
+    def _only_known(self, tokens, known):
+        return all(
+            token in FILLER_WORDS or token in known or re.fullmatch(r"\d+(?:\.\d+)?", token)
+            for token in tokens
+        )
+
+    def _fullscreen(self, tokens, scan):
+        known = {"fullscreen", "full", "screen", "enter", "open", "make", "show", "go", "into", "to", "mode"}
+        if not scan or not self._only_known(tokens, known) or self._numbers(tokens):
+            return None
+        return [{"action": "enter_fullscreen", "scan_name": scan, "intend": f"Enter fullscreen on {scan}"}]
+
+    def _zoom(self, tokens, scan):
+        if not scan:
+            return None
+
+        if "reset" in tokens or "normal" in tokens:
+            known = {"zoom", "reset", "normal", "back", "bring", "out"}
+            if not self._only_known(tokens, known) or self._numbers(tokens):
+                return None
+            return [{
+                "action": "zoom", "scan_name": scan, "target_zoom": 1, "direction": "center",
+                "intend": f"Reset zoom on {scan}",
+            }]
+
+        numbers = self._numbers(tokens)
+        direction = self._direction(tokens)
+        known = {"zoom", "in", "into", "to", "by", "x", "top", "bottom", "left", "right", "center", "middle", "corner", "side"}
+        if len(numbers) != 1 or direction is None or not self._only_known(tokens, known):
+            return None
+        return [{
+            "action": "zoom", "scan_name": scan, "target_zoom": numbers[0], "direction": direction,
+            "intend": f"Zoom {scan} {direction} to {numbers[0]}x",
+        }]
+
+    def _direction(self, tokens):
+        vertical = next((t for t in tokens if t in {"top", "bottom"}), None)
+        horizontal = next((t for t in tokens if t in {"left", "right"}), None)
+        centered = any(t in {"center", "middle"} for t in tokens)
+
+        if vertical and horizontal:
+            direction = f"{vertical} {horizontal}"
+        elif vertical and centered:
+            direction = f"center {vertical}"
+        elif horizontal and centered:
+            direction = f"middle {horizontal}"
+        elif centered and not vertical and not horizontal:
+            direction = "center"
+        else:
+            return None
+        return direction if direction in ZOOM_DIRECTIONS else None
+
+    def _slider(self, tokens, scan):
+        if not scan:
+            return None
+
+        speed = 1
+        if "per" in tokens or "second" in tokens:
+            speed, tokens = self._take_speed(tokens)
+            if speed is None:
+                return None
+        tokens = self._words(tokens)
+        words = set(tokens)
+
+        numbers = self._numbers(tokens)
+        if len(numbers) != 1 or numbers[0] != int(numbers[0]):
+            return None
+        value = int(numbers[0])
+
+        increase = words & INCREASE_WORDS
+        decrease = words & DECREASE_WORDS
+        absolute = words & ABSOLUTE_WORDS
+        relative_marker = words & RELATIVE_MARKERS
+        absolute_marker = words & ABSOLUTE_MARKERS
+        known = INCREASE_WORDS | DECREASE_WORDS | ABSOLUTE_WORDS | RELATIVE_MARKERS | ABSOLUTE_MARKERS
+
+        if not self._only_known(tokens, known) or (relative_marker and absolute_marker):
+            return None
+
+        # A verb and a preposition that disagree ("move axial by 10", "increase axial to 30") go to the model
+        if increase and not decrease and not (absolute - {"move"}) and not absolute_marker:
+            target_value, increment_mode, intend = value, 1, f"Increase {scan} slider by {value}"
+        elif decrease and not increase and not (absolute - {"move"}) and not absolute_marker:
+            target_value, increment_mode, intend = -value, 1, f"Decrease {scan} slider by {value}"
+        elif (absolute or absolute_marker) and not increase and not decrease and not relative_marker:
+            target_value, increment_mode, intend = value, 0, f"Set {scan} slider to {value}"
+        else:
+            return None
+
+        return [{
+            "action": "move_slider", "target_text": scan, "target_value": target_value,
+            "increment_mode": increment_mode, "slides_per_sec": speed, "intend": intend,
+        }]
+
+    def _take_speed(self, tokens):
+        # The speed is the number right before "per second" ("3 slides per second") or right after
+        # it ("slider per second 3"), within the same clause. Returns (None, tokens) unless exactly
+        # one of the two is there
+        at = tokens.index("per") if "per" in tokens else -1
+        if at < 0 or tokens[at + 1:at + 2] != ["second"] or tokens.count("per") > 1:
+            return None, tokens
+
+        candidates = []
+        before = at - 1
+        while before >= 0 and tokens[before] in SPEED_WORDS:
+            before -= 1
+        if before >= 0 and re.fullmatch(r"\d+", tokens[before]):
+            candidates.append(before)
+        after = at + 2
+        while after < len(tokens) and tokens[after] in SPEED_WORDS:
+            after += 1
+        if after < len(tokens) and re.fullmatch(r"\d+", tokens[after]):
+            candidates.append(after)
+        if len(candidates) != 1:
+            return None, tokens
+
+        speed = int(tokens[candidates[0]])
+        dropped = {candidates[0], at, at + 1}
+        rest = [token for i, token in enumerate(tokens) if i not in dropped and token != "speed"]
+        return speed, rest
@@ -0,0 +1,127 @@
+import glob
+import os
+import re
+import struct
+from datetime import datetime
+
+
+# Sidecar layout: the log size it covers (uint64), then the byte offset of every entry (uint64 each)
+INDEX_SUFFIX = ".idx"
+OFFSET = struct.Struct("<Q")
+ENTRY_START = re.compile(rb"^\d+ \[")
+
+
+class DictationLog:
+    # Append-only "N [HH:MM:SS] - text" log with a sidecar index of entry offsets. The log itself stays
+    # plain text; the index makes the entry count O(1) on resume and gives random access to entries
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.log = open(path, "ab+")
+        self.index = None
+        self.count = 0
+        self._open_index()
+
+    def __len__(self):
+        return self.count
+
+    def _open_index(self):
+        log_size = os.path.getsize(self.path)
+        if os.path.exists(self.index_path):
+            self.index = open(self.index_path, "rb+")
+            header = self.index.read(OFFSET.size)
+            index_size = os.path.getsize(self.index_path)
+            if len(header) == OFFSET.size and OFFSET.unpack(header)[0] == log_size and index_size % OFFSET.size == 0:
+                self.count = index_size // OFFSET.size - 1
+                return
+            self.index.close()
+        # No index yet (a plain-text log from before) or the log was changed behind its back
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        offsets = []
+        self.log.seek(0)
+        position = 0
+        for line in self.log:
+            if ENTRY_START.match(line):
+                offsets.append(position)
+            position += len(line)
+
+        self.index = open(self.index_path, "wb+")
+        self.index.write(OFFSET.pack(position))
+        self.index.write(b"".join(OFFSET.pack(offset) for offset in offsets))
+        self.index.flush()
+        self.count = len(offsets)
+
+    def append(self, text: str) -> str:
+        number = self.count + 1
+        formatted = f"{number} [{datetime.now().strftime('%H:%M:%S')}] - {' '.join(text.split())}"
+
+        self.log.seek(0, os.SEEK_END)
+        offset = self.log.tell()
+        self.log.write(formatted.encode("utf-8") + b"\n")
+        self.log.flush()
+
+        # Offset first, then the covered size, so a crash in between only costs a rebuild
+        self.index.seek(0, os.SEEK_END)
+        self.index.write(OFFSET.pack(offset))
+        self.index.seek(0)
+        self.index.write(OFFSET.pack(self.log.tell()))
+        self.index.flush()
+
+        self.count = number
+        return formatted
+
+    def _offset(self, n: int) -> int:
+        self.index.seek(n * OFFSET.size)
+        return OFFSET.unpack(self.index.read(OFFSET.size))[0]
+
+    def entry(self, number: int) -> str:
+        # Entries are numbered from 1 like in the file
+        if not 1 <= number <= self.count:
+            raise IndexError(f"Log has {self.count} entries, no entry {number}")
+        start = self._offset(number)
+        end = self._offset(number + 1) if number < self.count else os.path.getsize(self.path)
+        self.log.seek(start)
+        return self.log.read(end - start).decode("utf-8").rstrip("\n")
+
+    def search(self, term: str):
+        # (entry number, line) for every entry containing term, case-insensitive
+        needle = term.lower().encode("utf-8")
+        self.log.seek(0)
+        matches = []
+        number = 0
+        for line in self.log:
+            if ENTRY_START.match(line):
+                number += 1
+            if needle in line.lower():
+                matches.append((number, line.decode("utf-8").rstrip("\n")))
+        return matches
+
+    def close(self):
+        self.log.close()
+        if self.index:
+            self.index.close()
+
+
+def search_logs(term: str, day: str = "", directory: str = "./logs"):
+    # Searches every log of a day ("YYYY-MM-DD", all days if empty), returns (file, entry number, line)
+    matches = []
+    for path in sorted(glob.glob(os.path.join(directory, f"{day}*.txt"))):
+        log = DictationLog(path)
+        try:
+            matches.extend((path, number, line) for number, line in log.search(term))
+        finally:
+            log.close()
+    return matches
+
+
+def migrate_logs(directory: str = "./logs") -> int:
+    # Builds the index for every plain-text log that doesn't have an up-to-date one yet
+    migrated = 0
+    for path in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+        had_index = os.path.exists(path + INDEX_SUFFIX)
+        log = DictationLog(path)
+        log.close()
+        migrated += not had_index
+    return migrated
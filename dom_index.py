@@ -0,0 +1,67 @@
+import math
+import re
+from collections import defaultdict
+
+
+STOP_WORDS = {
+    "a", "an", "the", "to", "of", "on", "in", "at", "by", "for", "and", "or", "is", "it", "this",
+    "that", "please", "can", "you", "me", "my", "i", "with", "from", "el",
+}
+
+# Words that pick an element by its place in a list ("the third volume", "volume five")
+POSITION_WORDS = {
+    "first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth", "tenth", "last",
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen", "twenty",
+}
+
+
+def tokenize(text: str):
+    # Splits on anything that isn't a letter or digit, so "el-button__inner" gives "button" and "inner"
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOP_WORDS]
+
+
+def refers_to_position(query: str) -> bool:
+    # "open volume 5", "select the 3rd row", "the last one": the element is found by counting its
+    # siblings, not by its text, so a text search can't pick it out
+    words = re.findall(r"[a-z0-9]+", query.lower())
+    return any(word[0].isdigit() or word in POSITION_WORDS for word in words)
+
+
+class DomIndex:
+    # In-memory BM25 index over DOM elements, one document per element
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # Term -> {element ID: term frequency}
+        self.lengths = {}                  # Element ID -> number of terms
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, element_id: int, text: str):
+        terms = tokenize(text)
+        if not terms:
+            return
+        self.lengths[element_id] = len(terms)
+        self.total_length += len(terms)
+        for term in terms:
+            self.postings[term][element_id] = self.postings[term].get(element_id, 0) + 1
+
+    def search(self, query: str, k: int = 50):
+        if not self.lengths:
+            return []
+
+        average_length = self.total_length / len(self.lengths)
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            matches = self.postings.get(term)
+            if not matches:
+                continue
+            idf = math.log(1 + (len(self.lengths) - len(matches) + 0.5) / (len(matches) + 0.5))
+            for element_id, frequency in matches.items():
+                norm = 1 - self.b + self.b * self.lengths[element_id] / average_length
+                scores[element_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
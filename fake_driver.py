@@ -0,0 +1,188 @@
+import time
+from bs4 import BeautifulSoup, Comment, Tag
+from selenium.common.exceptions import WebDriverException
+import llm_command_parser as parser_module
+from page_settle import SETTLE_STATE_JS
+
+
+# Stands in for Chrome on a saved page, for checking LLMCommandParser without a browser. page_source
+# returns the HTML, and the in-page scripts the parser runs are evaluated in Python against a
+# BeautifulSoup copy of it, which plays the live DOM. Elements are handed back as bs4 Tags.
+# Every kept element gets a 20px tall box stacked in document order, scroll_y shifts them up.
+# Bump mutations after changing the document, that's what the page version counts.
+# Page settling is scripted through ready_state, requests ((started, answered) times, answered None
+# for never), last_activity and ticking (a DOM that changes all the time), all read against clock
+class FakeDriver:
+    def __init__(self, html: str, viewport=(1280, 800)):
+        self.page_source = html
+        self.document = BeautifulSoup(html, "html.parser")
+        self.viewport = list(viewport)
+        self.scroll_y = 0
+        self.mutations = 0
+        self.registry = None  # window.__agentElements as (token, nodes)
+        self.changed = []     # Form fields the form sync saw change, see type_into
+        self.scripts = []     # Names of the scripts run, in order
+
+        self.clock = time.monotonic
+        self.ready_state = "complete"
+        self.requests = []
+        self.last_activity = float("-inf")
+        self.ticking = False
+
+        keep_tags = parser_module.ESSENTIAL_CONTENT_TAGS
+        self.positions = {id(el): i for i, el in enumerate(self._walk(self.document.body, keep_tags))}
+
+    def type_into(self, el: Tag, value: str):
+        # What typing into a field does with the form sync installed: data-value follows the value
+        el["data-value"] = value
+        if el not in self.changed:
+            self.changed.append(el)
+        self.mutations += 1
+
+    def _walk(self, el: Tag, keep_tags):
+        if el is None:
+            return
+        yield el
+        for child in el.children:
+            if isinstance(child, Tag) and child.name in keep_tags:
+                yield from self._walk(child, keep_tags)
+
+    def _box(self, el: Tag) -> dict:
+        y = self.positions.get(id(el), 0) * 20 - self.scroll_y
+        visible = "display:none" not in el.get("style", "").replace(" ", "")
+        return {"visible": visible, "rect": [0, y, 100, 20]}
+
+    def _attrs(self, el: Tag, keep_attrs) -> dict:
+        attrs = {}
+        for name in keep_attrs:
+            if el.has_attr(name):
+                value = el[name]
+                attrs[name] = " ".join(value) if isinstance(value, list) else value
+        return attrs
+
+    def _query(self, selector: str):
+        try:
+            return self.document.select_one(selector)
+        except Exception:
+            return None
+
+    def _connected(self, el: Tag) -> bool:
+        while el is not None:
+            if el is self.document:
+                return True
+            el = el.parent
+        return False
+
+    def _extract(self, keep_tags, keep_attrs, token):
+        keep_tags = set(keep_tags)
+        nodes = []
+
+        def walk(el: Tag) -> dict:
+            nodes.append(el)
+            box = self._box(el)
+            node = {"tag": el.name, "attrs": self._attrs(el, keep_attrs), "text": "",
+                    "visible": box["visible"], "rect": box["rect"], "children": []}
+            text = []
+            for child in el.children:
+                if isinstance(child, Tag):
+                    if child.name in keep_tags:
+                        node["children"].append(walk(child))
+                elif not isinstance(child, Comment) and child.strip():
+                    text.append(child.strip())
+            node["text"] = " ".join(text)
+            return node
+
+        html = self.document.html
+        children = [c for c in html.children if isinstance(c, Tag)]
+        if self.document.body is None:
+            body = {"tag": "body", "attrs": {}, "text": "", "visible": False, "rect": [0, 0, 0, 0], "children": []}
+            body_index = len(children) + 1
+        else:
+            body = walk(self.document.body)
+            body_index = children.index(self.document.body) + 1
+        self.registry = (token, nodes)
+        return {
+            "htmlAttrs": self._attrs(html, keep_attrs),
+            "bodyIndex": body_index,
+            "body": body,
+            "viewport": self.viewport,
+        }
+
+    def execute_script(self, script: str, *args):
+        if script == parser_module.PAGE_VERSION_JS:
+            self.scripts.append("version")
+            version = f"fake:{self.mutations}" + (f"@{self.scroll_y}" if args[0] else "")
+            nodes = self.registry[1] if self.registry else []
+            changed = []
+            for el in self.changed:
+                position = next((i for i, node in enumerate(nodes) if node is el), -1)
+                if position >= 0:
+                    changed.append([position, el["data-value"]])
+            self.changed = []
+            return {"version": version, "token": self.registry[0] if self.registry else None, "changed": changed}
+
+        if script == parser_module.EXTRACT_DOM_JS:
+            self.scripts.append("extract")
+            return self._extract(*args)
+
+        if script == parser_module.PAGE_SOURCE_JS:
+            self.scripts.append("source")
+            self.registry = (args[1], list(self._walk(self.document.body, set(args[0]))))
+            return {"html": str(self.document.html), "count": len(self.registry[1])}
+
+        if script == parser_module.REGISTER_ELEMENTS_JS:
+            self.scripts.append("register")
+            self.registry = (args[0], [self._query(selector) for selector in args[1]])
+            return None
+
+        if script == parser_module.MEASURE_ELEMENTS_JS:
+            self.scripts.append("measure")
+            current = self.registry and self.registry[0] == args[0] and self.document.body is not None
+            nodes = self.registry[1] if current else []
+            return {"viewport": self.viewport, "boxes": [self._box(el) if el else None for el in nodes]}
+
+        if script == parser_module.LOOKUP_ELEMENT_JS:
+            self.scripts.append("lookup")
+            if self.registry is None or self.registry[0] != args[0]:
+                return "missing"
+            el = self.registry[1][args[1]] if args[1] < len(self.registry[1]) else None
+            if el is None or not self._connected(el):
+                return "stale"
+            return el
+
+        if script == SETTLE_STATE_JS:
+            self.scripts.append("settle")
+            now = self.clock()
+            if self.ticking:
+                self.last_activity = now
+            running = []
+            for started, answered in self.requests:
+                if answered is not None and answered <= now:
+                    self.last_activity = max(self.last_activity, answered)
+                else:
+                    running.append(started)
+            return {
+                "readyState": self.ready_state,
+                "inflight": sum(1 for started in running if (now - started) * 1000 < args[0]),
+                "quietMs": (now - self.last_activity) * 1000,
+            }
+
+        # Anything else (viewer helpers, form sync) isn't available
+        raise WebDriverException(f"FakeDriver can't run script: {script.strip()[:60]}")
+
+
+def offline_parser(driver, dom_backend: str = "soup", dom_format: str = "compact", top_k: int = 0,
+                   viewport_pruning: bool = False):
+    # LLMCommandParser on a fake driver, skipping __init__ since that launches Chrome
+    parser = parser_module.LLMCommandParser.__new__(parser_module.LLMCommandParser)
+    parser.driver = driver
+    parser.dom_format = dom_format
+    parser.dom_backend = dom_backend
+    parser.top_k = top_k
+    parser.viewport_pruning = viewport_pruning
+    parser.view_cache = {}
+    parser.view_cache_url = None
+    parser.selector_map = {}
+    parser.snapshot_token = 0
+    parser.reset_snapshot()
+    return parser
@@ -2,50 +2,580 @@ from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+import os
 import json
+import copy
+import hashlib
 import html_to_json
-from bs4 import BeautifulSoup, Tag
+from bs4 import BeautifulSoup, Comment, Tag
 import time
 import keyboard 
+from page_settle import PageSettler
+from viewer_helpers import ViewerHelpers
+from stage_timer import StageTimer
+from dom_index import DomIndex, refers_to_position
+
+
+# Chromedriver path from the last run, so startup doesn't ask webdriver_manager (and the network) every time
+DRIVER_PATH_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".chromedriver_path")
+
+# Fall back to a full snapshot when more than this fraction of elements changed
+SNAPSHOT_DIFF_MAX_RATIO = 0.5
+
+ESSENTIAL_CONTENT_TAGS = {
+    "html", "body", "button", "a", "label", "input", "textarea", "select", "option",
+    "span", "div", "h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "form", "img", "nav",
+    "section", "article", "table", "thead", "tbody", "tr", "td", "th", "ul", "ol",
+    "iframe", "video", "audio", "i", "canvas"
+}
+
+ESSENTIAL_ATTRIBUTES = {
+    "id", "class", "name", "type", "value", "href", "alt", "title", "role", "placeholder",
+    "onclick", "onchange", "for", "selected", "checked", "min", "max", "step", "data-value",
+    "aria-label", "aria-hidden", "data-testid"
+}
+
+# Walks the live DOM with the same pruning rules as page_source_parser and returns the pruned tree,
+# along with visibility and bounding box of every kept element
+EXTRACT_DOM_JS = """
+const keepTags = new Set(arguments[0]);
+const keepAttrs = arguments[1];
+const liveNodes = [];
+
+function pickAttrs(el) {
+    const attrs = {};
+    for (const name of keepAttrs) {
+        if (el.hasAttribute(name)) attrs[name] = el.getAttribute(name);
+    }
+    return attrs;
+}
+
+function walk(el) {
+    liveNodes.push(el);
+    const rect = el.getBoundingClientRect();
+    const node = {
+        tag: el.tagName.toLowerCase(),
+        attrs: pickAttrs(el),
+        text: "",
+        visible: el.getClientRects().length > 0 && getComputedStyle(el).visibility !== "hidden",
+        rect: [Math.round(rect.x), Math.round(rect.y), Math.round(rect.width), Math.round(rect.height)],
+        children: [],
+    };
+    const text = [];
+    for (const child of el.childNodes) {
+        if (child.nodeType === Node.TEXT_NODE) {
+            const value = child.textContent.trim();
+            if (value) text.push(value);
+        } else if (child.nodeType === Node.ELEMENT_NODE && keepTags.has(child.tagName.toLowerCase())) {
+            node.children.push(walk(child));
+        }
+    }
+    node.text = text.join(" ");
+    return node;
+}
+
+const html = document.documentElement;
+// A document that is still loading has no body yet, it comes back as an empty one, the way
+// page_source_parser sees it
+const body = document.body
+    ? walk(document.body)
+    : { tag: "body", attrs: {}, text: "", visible: false, rect: [0, 0, 0, 0], children: [] };
+// Keep the walked elements around so actions can look them up without a selector
+window.__agentElements = { token: arguments[2], nodes: liveNodes };
+return {
+    htmlAttrs: html ? pickAttrs(html) : {},
+    bodyIndex: html && document.body
+        ? Array.from(html.children).indexOf(document.body) + 1
+        : (html ? html.children.length : 0) + 1,
+    body: body,
+    viewport: [window.innerWidth, window.innerHeight],
+};
+"""
+
+# Resolves every selector of a snapshot once and keeps the live elements for direct lookups
+REGISTER_ELEMENTS_JS = """
+window.__agentElements = {
+    token: arguments[0],
+    nodes: arguments[1].map(selector => {
+        try {
+            return document.querySelector(selector);
+        } catch (e) {
+            return null;
+        }
+    }),
+};
+"""
+
+# Serializes the page for the soup backend and registers its elements in the same call, so both
+# describe the same DOM. Registry positions follow a preorder walk with page_source_parser's pruning,
+# which is the order the parsed snapshot hands out element IDs in
+PAGE_SOURCE_JS = """
+const keepTags = new Set(arguments[0]);
+const nodes = [];
+function walk(el) {
+    nodes.push(el);
+    for (const child of el.children) {
+        if (keepTags.has(child.tagName.toLowerCase())) walk(child);
+    }
+}
+if (document.body) walk(document.body);
+window.__agentElements = { token: arguments[1], nodes: nodes };
+return { html: document.documentElement ? document.documentElement.outerHTML : "", count: nodes.length };
+"""
+
+# Measures the registered elements of a soup snapshot, for viewport pruning on the soup backend
+MEASURE_ELEMENTS_JS = """
+const registry = window.__agentElements;
+const nodes = registry && registry.token === arguments[0] && document.body ? registry.nodes : [];
+return {
+    viewport: [window.innerWidth, window.innerHeight],
+    boxes: nodes.map(el => {
+        if (!el) return null;
+        const rect = el.getBoundingClientRect();
+        return {
+            visible: el.getClientRects().length > 0 && getComputedStyle(el).visibility !== "hidden",
+            rect: [Math.round(rect.x), Math.round(rect.y), Math.round(rect.width), Math.round(rect.height)],
+        };
+    }),
+};
+"""
+
+# Returns the live element at a registry position, or "missing" / "stale" when it can't be used
+LOOKUP_ELEMENT_JS = """
+const registry = window.__agentElements;
+if (!registry || registry.token !== arguments[0]) return "missing";
+const el = registry.nodes[arguments[1]];
+if (!el || !el.isConnected) return "stale";
+return el;
+"""
+
+DOM_BACKENDS = {"soup", "browser"}
+
+# "animate" clicks the chevrons inside the page at slides_per_sec, "set" types the target slice
+# into the slice input and only clicks if the viewer doesn't take it
+SLIDER_MODE = "animate"
+SLIDER_POLL_INTERVAL = 0.1
+# A movement is given its expected duration plus this long before it is stopped
+SLIDER_DEADLINE_MARGIN = 5.0
+
+# Zoom origin for each supported direction, as fractions of the canvas width and height
+ZOOM_ORIGINS = {
+    "top left": (0.05, 0.10), "top right": (0.95, 0.10),
+    "bottom left": (0.05, 0.90), "bottom right": (0.95, 0.90),
+    "center": (0.5, 0.5), "center top": (0.5, 0.10), "center bottom": (0.5, 0.90),
+    "middle left": (0.05, 0.5), "middle right": (0.95, 0.5),
+}
+
+# Keeps every form field's data-value attribute equal to its current value, installed once per
+# document. Typing and change events, values set from script and newly added fields all update it,
+# and updated fields are remembered in window.__agentFormSync.changed
+FORM_SYNC_JS = """
+if (!window.__agentFormSync) {
+    const sync = { changed: new Set() };
+    const fields = "input, textarea, select";
+    const valueOf = el => el.tagName.toLowerCase() === "select"
+        ? el.options[el.selectedIndex]?.text || ""
+        : el.value || "";
+    // Only touch attributes that actually changed, so the page version stays put otherwise
+    const update = el => {
+        const value = valueOf(el);
+        if (el.getAttribute("data-value") !== value) {
+            el.setAttribute("data-value", value);
+            sync.changed.add(el);
+        }
+    };
+
+    for (const type of ["input", "change"]) {
+        document.addEventListener(type, event => {
+            if (event.target.matches?.(fields)) update(event.target);
+        }, true);
+    }
+
+    // Frameworks assign .value directly, which fires no event
+    const properties = [
+        [HTMLInputElement.prototype, "value"], [HTMLTextAreaElement.prototype, "value"],
+        [HTMLSelectElement.prototype, "value"], [HTMLSelectElement.prototype, "selectedIndex"],
+    ];
+    for (const [proto, name] of properties) {
+        const descriptor = Object.getOwnPropertyDescriptor(proto, name);
+        Object.defineProperty(proto, name, {
+            ...descriptor,
+            set(value) {
+                descriptor.set.call(this, value);
+                if (this.isConnected) update(this);
+            },
+        });
+    }
+
+    new MutationObserver(records => {
+        for (const record of records) {
+            for (const node of record.addedNodes) {
+                if (node.nodeType !== Node.ELEMENT_NODE) continue;
+                if (node.matches(fields)) update(node);
+                node.querySelectorAll(fields).forEach(update);
+            }
+        }
+    }).observe(document, { childList: true, subtree: true });
+
+    document.querySelectorAll(fields).forEach(update);
+    sync.changed.clear();
+    window.__agentFormSync = sync;
+}
+"""
+
+# Installs form sync and a MutationObserver once per document and returns the page version
+# "<document token>:<mutation count>", which changes whenever the DOM does or the page navigates.
+# With arguments[0] set, scrolling (of the page or any element) and resizing count too, for
+# snapshots that depend on geometry. Also hands over the form fields updated since the last call,
+# as [registry position, value] pairs
+PAGE_VERSION_JS = FORM_SYNC_JS + """
+if (!window.__agentDomVersion) {
+    const version = { token: Math.random().toString(36).slice(2), count: 0, moves: 0 };
+    version.observer = new MutationObserver(records => { version.count += records.length; });
+    version.observer.observe(document, {
+        subtree: true, childList: true, attributes: true, characterData: true,
+    });
+    const moved = () => { version.moves++; };
+    document.addEventListener("scroll", moved, { capture: true, passive: true });
+    window.addEventListener("resize", moved, { passive: true });
+    window.__agentDomVersion = version;
+}
+const version = window.__agentDomVersion;
+// Count mutations made earlier in this same script too, e.g. by the first form sync
+version.count += version.observer.takeRecords().length;
+
+const registry = window.__agentElements;
+const changed = [];
+for (const el of window.__agentFormSync.changed) {
+    const position = registry ? registry.nodes.indexOf(el) : -1;
+    if (position >= 0) changed.push([position, el.getAttribute("data-value")]);
+}
+window.__agentFormSync.changed.clear();
+
+return {
+    version: version.token + ":" + version.count + (arguments[0] ? "@" + version.moves : ""),
+    token: registry ? registry.token : null,
+    changed: changed,
+};
+"""
+
+# Longest text kept per element in the compact format
+COMPACT_TEXT_LIMIT = 80
+
+# Attributes whose values go into the relevance index next to the element's own text
+INDEXED_ATTRIBUTES = ("aria-label", "placeholder", "title", "class", "name", "alt", "data-testid")
+
+# Full snapshots with at least this many elements are cut down to the ones relevant to the request,
+# unless the request picks an element by position, which needs the whole list to count in
+RELEVANCE_MIN_ELEMENTS = 300
+# Siblings of a match are sent along when its parent has at most this many children (e.g. a table row)
+RELEVANCE_SIBLING_LIMIT = 8
+
+
+def own_text(el: Tag) -> str:
+    return " ".join(s.strip() for s in el.find_all(string=True, recursive=False) if s.strip())
+
+
+def compact_line(element_id, tag: str, attrs: dict, text: str) -> str:
+    parts = [f"[{element_id}] {tag}"]
+    for k, v in attrs.items():
+        if k == "_element_id":
+            continue
+        v = " ".join(v) if isinstance(v, list) else str(v)
+        parts.append(f'{k}="{v}"' if not v or " " in v else f"{k}={v}")
+    text = " ".join(text.split())
+    if text:
+        if len(text) > COMPACT_TEXT_LIMIT:
+            text = text[:COMPACT_TEXT_LIMIT] + "…"
+        parts.append(json.dumps(text, ensure_ascii=False))
+    return " ".join(parts)
+
+
+def collapsed_note(count: int) -> str:
+    return f"{count} off-screen elements, scroll to see them"
+
+
+def merged_note(siblings: int, count: int, where: str) -> str:
+    return f"… {siblings} elements {where} ({count} with their contents), scroll to see them"
+
+
+def serialize_json(root: Tag, keep=None, collapsed=None, merged=None) -> str:
+    if keep is not None or collapsed or merged:
+        # Copying turns attribute values into strings (and drops an ID of 0), so compare as text
+        original, root = root, copy.copy(root)
+        root.attrs = dict(original.attrs)
+        keep = None if keep is None else {str(element_id) for element_id in keep}
+        collapsed = {str(element_id): count for element_id, count in (collapsed or {}).items()}
+        merged = {str(element_id): note for element_id, note in (merged or {}).items()}
+        for el in root.find_all(True):
+            if el.decomposed:
+                continue
+            element_id = el.get("_element_id")
+            if keep is not None and element_id not in keep:
+                el.decompose()
+            elif element_id in merged:
+                el.clear()
+                el.attrs = {"_collapsed": merged[element_id]}
+            elif element_id in collapsed:
+                el.clear()
+                el["_collapsed"] = collapsed_note(collapsed[element_id])
+    return json.dumps(html_to_json.convert(str(root)))
+
+
+def serialize_compact(root: Tag, depth: int = 0, keep=None, collapsed=None, merged=None) -> str:
+    # One element per line, indentation shows nesting. keep limits the output to those element IDs,
+    # collapsed elements (ID -> hidden descendant count) are shown without their subtree, and merged
+    # ones (ID -> note) are replaced by the note, standing in for a run of siblings
+    lines = []
+    stack = [(root, depth)]
+    while stack:
+        el, level = stack.pop()
+        element_id = el.get("_element_id")
+        if merged and element_id in merged:
+            lines.append("  " * level + merged[element_id])
+            continue
+        line = "  " * level + compact_line(element_id, el.name, el.attrs, own_text(el))
+        if collapsed and element_id in collapsed:
+            lines.append(f"{line} (+{collapsed_note(collapsed[element_id])})")
+            continue
+        lines.append(line)
+        children = [c for c in el.children if isinstance(c, Tag)]
+        if keep is not None:
+            children = [c for c in children if c.get("_element_id") in keep]
+        stack.extend((c, level + 1) for c in reversed(children))
+    return "\n".join(lines)
+
+
+DOM_SERIALIZERS = {
+    "json": serialize_json,
+    "compact": serialize_compact,
+}
+
+
+def resolve_driver_path(refresh: bool = False):
+    # Returns (path, came from the cache)
+    if not refresh:
+        try:
+            with open(DRIVER_PATH_CACHE, "r", encoding="utf-8") as f:
+                path = f.read().strip()
+            if path and os.path.exists(path):
+                return path, True
+        except OSError:
+            pass
+
+    from webdriver_manager.chrome import ChromeDriverManager
+    path = ChromeDriverManager().install()
+    try:
+        with open(DRIVER_PATH_CACHE, "w", encoding="utf-8") as f:
+            f.write(path)
+    except OSError:
+        pass
+    return path, False
 
 
 class LLMCommandParser:
-    def __init__(self, url: str, usr_dir: str):
+    def __init__(self, url: str, usr_dir: str, dom_format: str = "json", dom_backend: str = "soup", top_k: int = 0,
+                 viewport_pruning: bool = False):
+        if dom_format not in DOM_SERIALIZERS:
+            raise ValueError(f"Unknown DOM format: {dom_format}, choose one of {sorted(DOM_SERIALIZERS)}")
+        if dom_backend not in DOM_BACKENDS:
+            raise ValueError(f"Unknown DOM backend: {dom_backend}, choose one of {sorted(DOM_BACKENDS)}")
+        self.dom_format = dom_format
+        self.dom_backend = dom_backend
+        self.top_k = top_k  # 0 always sends the full snapshot
+        self.viewport_pruning = viewport_pruning  # Drop invisible subtrees, collapse off-screen ones
+
         options = webdriver.ChromeOptions()
         options.add_argument(f"--user-data-dir={usr_dir}")
         options.add_argument("--log-level=3")
         options.add_experimental_option("excludeSwitches", ["enable-logging"])
         options.add_argument("disable-logging")
 
-        self.driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install(), log_path="NUL"),
-            options=options,
-        )
-        self.goto(url)
+        self.startup_timer = StageTimer()
+        self.driver = self._launch_browser(options)
+        self.settler = PageSettler(self.driver)
+        self.viewer = ViewerHelpers(self.driver)
+        self.viewer.install()
+        with self.startup_timer.stage("first page"):
+            self.goto(url)
 
-        self.page_html = self.driver.page_source
+        # Scan name -> view handles (container, canvas, slice input, chevrons, fullscreen button).
+        # The panes don't change within a study, so this outlives tasks and is only dropped when
+        # the URL changes or a handle goes stale
+        self.view_cache = {}
+        self.view_cache_url = None
 
         self.selector_map = {}
+        self.snapshot_token = 0  # Never reset, so a page never matches a registry from an older snapshot
+        self.reset_snapshot()
 
 
-    def page_source_parser(self, html: str) -> str:
-        soup = BeautifulSoup(html, "html.parser")
-        self.selector_map = {}  # Reset selector map
-        element_counter = [0]   # Counter for assigning unique element IDs
-
-        ESSENTIAL_CONTENT_TAGS = {
-            "html", "body", "button", "a", "label", "input", "textarea", "select", "option",
-            "span", "div", "h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "form", "img", "nav",
-            "section", "article", "table", "thead", "tbody", "tr", "td", "th", "ul", "ol",
-            "iframe", "video", "audio", "i", "canvas"
-        }
+    def _launch_browser(self, options):
+        with self.startup_timer.stage("driver"):
+            driver_path, cached = resolve_driver_path()
+        try:
+            with self.startup_timer.stage("browser"):
+                return webdriver.Chrome(service=Service(driver_path, log_path="NUL"), options=options)
+        except Exception:
+            if not cached:
+                raise
+            # Chrome probably updated past the cached driver, fetch a matching one and try again
+            with self.startup_timer.stage("driver"):
+                driver_path, _ = resolve_driver_path(refresh=True)
+            with self.startup_timer.stage("browser"):
+                return webdriver.Chrome(service=Service(driver_path, log_path="NUL"), options=options)
+
+    def reset_snapshot(self):
+        # Forget the previous snapshot, the next parse starts over with fresh element IDs
+        self.element_keys = {}  # Structural key -> stable element ID
+        self.next_element_id = 0
+        self.last_snapshot = None
+        self.last_snapshot_mode = "full"
+        self.last_viewport_state = None  # Kept and collapsed elements of the diff base, when viewport-pruned
+        self.element_geometry = {}  # Element ID -> visibility and bounding box, browser backend only
+
+        # Parsed snapshot of the current DOM state, reused until the page version changes
+        self.cached_snapshot = None
+        self.snapshot_cache_hits = 0
+        self.snapshot_cache_misses = 0
+
+        # Snapshot the current selector_map and live element registry belong to
+        self.current_snapshot = None
+        self.lookup_stats = {"direct": 0, "fallback": 0, "stale": 0, "seconds": 0.0}
+        self.view_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+        # Elements sent in the last relevance-filtered snapshot, None when the full snapshot went out
+        self.last_relevant_count = None
+        # Element counts of the last viewport-pruned snapshot, None when it wasn't pruned
+        self.last_viewport_stats = None
+
+        # Form fields that changed since the last capture, from the in-page form sync
+        self.pending_changed_fields = {}
+        self.last_changed_fields = {}
+
+    def snapshot_cache_stats(self) -> dict:
+        return {"hits": self.snapshot_cache_hits, "misses": self.snapshot_cache_misses}
+
+    def resolve_element(self, element_id: int):
+        start = time.perf_counter()
+        try:
+            element = self._lookup_live_element(element_id)
+            if element is not None:
+                self.lookup_stats["direct"] += 1
+                return element
+
+            self.lookup_stats["fallback"] += 1
+            return self.driver.find_element(By.CSS_SELECTOR, self.selector_map[element_id])
+        finally:
+            self.lookup_stats["seconds"] += time.perf_counter() - start
+
+    def _lookup_live_element(self, element_id: int):
+        built = self.current_snapshot
+        if built is None or element_id not in built["live_index"]:
+            return None
+
+        args = (built["token"], built["live_index"][element_id])
+        element = self.driver.execute_script(LOOKUP_ELEMENT_JS, *args)
+        if element == "missing" and built["register_on_demand"]:
+            # Soup snapshots register their elements on first use
+            self.driver.execute_script(REGISTER_ELEMENTS_JS, built["token"], list(built["selector_map"].values()))
+            built["register_on_demand"] = False
+            element = self.driver.execute_script(LOOKUP_ELEMENT_JS, *args)
+
+        if element == "stale":
+            self.lookup_stats["stale"] += 1
+        if isinstance(element, str):
+            return None
+        return element
+
+    def invalidate_views(self):
+        if self.view_cache:
+            self.view_cache_stats["invalidations"] += 1
+        self.view_cache = {}
+
+    def view_handles(self, scan_name: str) -> dict:
+        key = scan_name.strip().lower()
+        if key in self.view_cache:
+            self.view_cache_stats["hits"] += 1
+            return self.view_cache[key]
+
+        self.view_cache_stats["misses"] += 1
+        handles = self.viewer.call("handles", scan_name)
+        if handles is None:
+            raise NoSuchElementException(f"No view for scan {scan_name}")
+        self.view_cache[key] = handles
+        return handles
+
+    def call_view(self, name: str, scan_name: str, *args):
+        # Runs a viewer helper against the cached handles, looking them up again once if they went stale
+        try:
+            return self.viewer.call(name, self.view_handles(scan_name), *args)
+        except StaleElementReferenceException:
+            self.invalidate_views()
+            return self.viewer.call(name, self.view_handles(scan_name), *args)
 
-        ESSENTIAL_ATTRIBUTES = {
-            "id", "class", "name", "type", "value", "href", "alt", "title", "role", "placeholder",
-            "onclick", "onchange", "for", "selected", "checked", "min", "max", "step", "data-value",
-            "aria-label", "aria-hidden", "data-testid"
-        }
+    def page_version(self):
+        try:
+            page = self.driver.execute_script(PAGE_VERSION_JS, self.viewport_pruning)
+        except Exception:
+            return None
+
+        # Form fields updated since the last call, kept until a capture that moves the diff base
+        built = self.current_snapshot
+        if page["changed"] and built is not None and page["token"] == built["token"]:
+            if "live_ids" not in built:
+                built["live_ids"] = {position: element_id for element_id, position in built["live_index"].items()}
+            for position, value in page["changed"]:
+                if position in built["live_ids"]:
+                    self.pending_changed_fields[built["live_ids"][position]] = value
+        return page["version"]
+
+    def changed_fields(self) -> dict:
+        # Element ID -> new value of the form fields that changed before the last capture
+        return dict(self.last_changed_fields)
+
+    def capture_dom(self, diff: bool = False, update_base: bool = True, query: str = "") -> str:
+        version = self.page_version()
+        html = None
+        if version is None and self.dom_backend == "soup":
+            # No mutation counter on this page, fall back to hashing the source
+            html = self.driver.page_source
+            version = "sha1:" + hashlib.sha1(html.encode("utf-8")).hexdigest()
+
+        if version is not None and self.cached_snapshot and self.cached_snapshot["version"] == version:
+            self.snapshot_cache_hits += 1
+            return self._render_snapshot(self.cached_snapshot, diff=diff, update_base=update_base, query=query)
+
+        self.snapshot_cache_misses += 1
+        if self.dom_backend == "browser":
+            built = self._extract_browser_dom()
+        else:
+            built = self._parse_page_source(html) if html is not None else self._capture_page_source()
+            if self.viewport_pruning:
+                self._measure_elements(built)
+        built["version"] = version
+        self.cached_snapshot = built
+        return self._render_snapshot(built, diff=diff, update_base=update_base, query=query)
+
+    def page_source_parser(self, html: str, diff: bool = False, update_base: bool = True) -> str:
+        return self._render_snapshot(self._parse_page_source(html), diff=diff, update_base=update_base)
+
+    def browser_dom_parser(self, diff: bool = False, update_base: bool = True) -> str:
+        return self._render_snapshot(self._extract_browser_dom(), diff=diff, update_base=update_base)
+
+    def _capture_page_source(self) -> dict:
+        self.snapshot_token += 1
+        page = self.driver.execute_script(PAGE_SOURCE_JS, sorted(ESSENTIAL_CONTENT_TAGS), self.snapshot_token)
+        built = self._parse_page_source(page["html"], token=self.snapshot_token)
+        if page["count"] != len(built["tags"]):
+            # The parsed tree doesn't line up with the live one, register by selector instead
+            self.driver.execute_script(REGISTER_ELEMENTS_JS, built["token"], list(built["selector_map"].values()))
+        built["register_on_demand"] = False
+        return built
+
+    def _parse_page_source(self, html: str, token=None) -> dict:
+        soup = BeautifulSoup(html, "html.parser")
 
         def prune_element(el: Tag):
             for child in list(el.contents):
@@ -58,60 +588,369 @@ class LLMCommandParser:
 
         for tag in soup(["script", "style"]):
             tag.decompose()
+        # Comments aren't text on the live page either, the browser backend never sees them
+        for comment in soup.find_all(string=lambda s: isinstance(s, Comment)):
+            comment.extract()
+        if soup.body is None:
+            # Still loading, an empty body like the one EXTRACT_DOM_JS reports
+            (soup.html or soup).append(soup.new_tag("body"))
 
         prune_element(soup.body)
 
+        if token is None:
+            self.snapshot_token += 1
+            token = self.snapshot_token
+        built = self._build_snapshot(soup.body)
+        built["token"] = token
+        built["geometry"] = {}
+        # Preorder positions, matching both PAGE_SOURCE_JS and REGISTER_ELEMENTS_JS
+        built["live_index"] = {element_id: i for i, element_id in enumerate(built["selector_map"])}
+        # Parsed from a bare HTML string nothing is registered yet, that happens by selector on first use
+        built["register_on_demand"] = True
+        return built
+
+    def _extract_browser_dom(self) -> dict:
+        # Pruning happens inside the page, Python only rebuilds the already small tree
+        self.snapshot_token += 1
+        page = self.driver.execute_script(
+            EXTRACT_DOM_JS, sorted(ESSENTIAL_CONTENT_TAGS), sorted(ESSENTIAL_ATTRIBUTES), self.snapshot_token
+        )
+
+        soup = BeautifulSoup("", "html.parser")
+        html = soup.new_tag("html", attrs=self._tag_attrs(page["htmlAttrs"]))
+        soup.append(html)
+
+        nodes = []
+        stack = [(page["body"], html)]
+        while stack:
+            node, parent = stack.pop()
+            el = soup.new_tag(node["tag"], attrs=self._tag_attrs(node["attrs"]))
+            if node["text"]:
+                el.append(node["text"])
+            parent.append(el)
+            nodes.append((el, node))
+            stack.extend((child, el) for child in reversed(node["children"]))
+
+        built = self._build_snapshot(html.body, root_idx=page["bodyIndex"])
+        built["token"] = self.snapshot_token
+        built["geometry"] = {
+            el["_element_id"]: {"visible": node["visible"], "rect": node["rect"]} for el, node in nodes
+        }
+        built["viewport"] = page["viewport"]
+        # Both the page and this list are in walk order, so positions line up with the page registry
+        built["live_index"] = {el["_element_id"]: i for i, (el, node) in enumerate(nodes)}
+        built["register_on_demand"] = False
+        return built
+
+    def _measure_elements(self, built: dict):
+        # One call returns visibility and boxes for all registered elements
+        page = self.driver.execute_script(MEASURE_ELEMENTS_JS, built["token"])
+        built["geometry"] = {
+            element_id: box for element_id, box in zip(built["live_index"], page["boxes"]) if box is not None
+        }
+        built["viewport"] = page["viewport"]
+
+    def _tag_attrs(self, attrs: dict) -> dict:
+        # BeautifulSoup keeps class as a list, match that so selectors come out the same
+        if "class" in attrs:
+            attrs["class"] = attrs["class"].split()
+        return attrs
+
+    def _build_snapshot(self, root: Tag, root_idx=None) -> dict:
+        selector_map = {}
+        snapshot = {}           # Structural key -> (element ID, parent key, signature)
+        snapshot_tags = {}      # Structural key -> Tag, used to serialize added subtrees
+
+        def selector_part(el: Tag, nth_of_type):
+            part = el.name
+            if el.has_attr('id'):
+                part += f"#{el['id']}"
+            elif el.has_attr('class'):
+                classes = [cls for cls in el['class'] if cls.strip()]
+                if classes:
+                    part += '.' + '.'.join(classes)
+            elif nth_of_type is not None:
+                part += f":nth-of-type({nth_of_type})"
+            return part
+
         def build_selector(el: Tag):
+            # Only used for the traversal root, descendants extend their parent's selector
             parts = []
             while el and el.name != '[document]':
-                part = el.name
-                if el.has_attr('id'):
-                    part += f"#{el['id']}"
-                elif el.has_attr('class'):
-                    classes = [cls for cls in el['class'] if cls.strip()]
-                    if classes:
-                        part += '.' + '.'.join(classes)
-                else:
-                    if el.parent:
-                        siblings = [sib for sib in el.parent.find_all(el.name, recursive=False)]
-                        index = siblings.index(el) + 1
-                        part += f":nth-of-type({index})"
-                parts.insert(0, part)
+                nth_of_type = None
+                if el.parent:
+                    nth_of_type = el.parent.find_all(el.name, recursive=False).index(el) + 1
+                parts.insert(0, selector_part(el, nth_of_type))
                 el = el.parent
             return ' > '.join(parts)
 
-        def assign_element_ids(el: Tag):
-            selector = build_selector(el)
-            el['_element_id'] = element_counter[0]
-            self.selector_map[element_counter[0]] = selector
-            element_counter[0] += 1
-
-            # Add idx based on order among all siblings (not just same tag)
-            if el.parent:
-                all_element_siblings = [c for c in el.parent.contents if isinstance(c, Tag)]
-                el['idx'] = str(all_element_siblings.index(el) + 1)
-
+        def element_signature(el: Tag, idx):
+            attrs = [(k, " ".join(v) if isinstance(v, list) else v) for k, v in el.attrs.items()]
+            if idx is not None:
+                attrs.append(("idx", str(idx)))
+            return (el.name, tuple(sorted(attrs)), own_text(el))
+
+        def assign_element_ids(el: Tag, key: str, parent_key, selector: str, idx):
+            # IDs are keyed on the element's structural position so they survive across snapshots
+            if key not in self.element_keys:
+                self.element_keys[key] = self.next_element_id
+                self.next_element_id += 1
+            element_id = self.element_keys[key]
+
+            snapshot[key] = (element_id, parent_key, element_signature(el, idx))
+            snapshot_tags[key] = el
+
+            el['_element_id'] = element_id
+            selector_map[element_id] = selector
+
+            # idx is the order among all siblings (not just same tag)
+            if idx is not None:
+                el['idx'] = str(idx)
+
+            # Single pass over the children: per-tag counters give nth-of-type, the running position gives idx
+            tag_counts = {}
+            id_counts = {}
+            position = 0
             for child in el.children:
                 if isinstance(child, Tag):
-                    assign_element_ids(child)
-
-        assign_element_ids(soup.body)
-
-        cleaned_html = str(soup.body)
-        data = html_to_json.convert(cleaned_html)
-
-        return json.dumps(data)
+                    position += 1
+                    tag_counts[child.name] = tag_counts.get(child.name, 0) + 1
+                    if child.has_attr('id'):
+                        child_key = f"{key} > {child.name}#{child['id']}"
+                        # Pages do repeat IDs, later siblings with the same one get their occurrence count
+                        id_counts[child_key] = id_counts.get(child_key, 0) + 1
+                        if id_counts[child_key] > 1:
+                            child_key += f":{id_counts[child_key]}"
+                    else:
+                        child_key = f"{key} > {child.name}:{tag_counts[child.name]}"
+                    child_selector = f"{selector} > {selector_part(child, tag_counts[child.name])}"
+                    assign_element_ids(child, child_key, key, child_selector, position)
+
+        if root_idx is None and root.parent:
+            root_idx = [c for c in root.parent.contents if isinstance(c, Tag)].index(root) + 1
+        assign_element_ids(root, "body", None, build_selector(root), root_idx)
+
+        return {"root": root, "snapshot": snapshot, "tags": snapshot_tags, "selector_map": selector_map}
+
+    def _render_snapshot(self, built: dict, diff: bool = False, update_base: bool = True, query: str = "") -> str:
+        self.current_snapshot = built
+        self.last_relevant_count = None
+        self.last_viewport_stats = None
+        self.selector_map = built["selector_map"]
+        self.element_geometry = built["geometry"]
+        snapshot = built["snapshot"]
+
+        # The diff signatures carry no geometry, so after a scroll the diff would say nothing changed
+        # while other elements are on-screen now. A different on-screen set gets a full render instead
+        viewport_state = self._viewport_state(built)
+        previous, previous_viewport_state = self.last_snapshot, self.last_viewport_state
+        if update_base:
+            self.last_snapshot = snapshot
+            self.last_viewport_state = viewport_state
+            self.last_changed_fields, self.pending_changed_fields = self.pending_changed_fields, {}
+
+        if diff and previous is not None and viewport_state == previous_viewport_state:
+            changes = self._diff_snapshots(previous, snapshot, built["tags"])
+            changed_count = len(changes["added"]) + len(changes["removed"]) + len(changes["changed"])
+            if changed_count <= SNAPSHOT_DIFF_MAX_RATIO * len(snapshot):
+                self.last_snapshot_mode = "diff"
+                return self._render_diff(changes)
+
+        self.last_snapshot_mode = "full"
+
+        # Relevance filtering takes precedence over viewport pruning and isn't pruned itself: the kept
+        # set is already small, and a match below the fold has to keep its ID to be scrolled to
+        if query and self.top_k and len(snapshot) >= RELEVANCE_MIN_ELEMENTS and not refers_to_position(query):
+            relevant = self.relevant_elements(built, query, self.top_k)
+            if relevant:
+                self.last_relevant_count = len(relevant)
+                note = (f"(showing {len(relevant)} of {len(snapshot)} elements, picked for relevance to the request; "
+                        "element IDs are unchanged)")
+                return DOM_SERIALIZERS[self.dom_format](built["root"], keep=relevant) + "\n" + note
+
+        if viewport_state is not None:
+            if "viewport_pruned" not in built:
+                keep, collapsed, merged = viewport_state
+                built["viewport_pruned"] = DOM_SERIALIZERS[self.dom_format](
+                    built["root"], keep=keep, collapsed=collapsed, merged=merged
+                )
+            self.last_viewport_stats = built["viewport_stats"]
+            return built["viewport_pruned"]
+
+        if "full" not in built:
+            built["full"] = DOM_SERIALIZERS[self.dom_format](built["root"])
+        return built["full"]
+
+    def _viewport_state(self, built: dict):
+        # (kept, collapsed, merged) of the viewport-pruned render, None when the snapshot isn't pruned
+        if not (self.viewport_pruning and built.get("viewport")):
+            return None
+        if "viewport_state" not in built:
+            keep, collapsed, merged, stats = self._viewport_prune(built)
+            built["viewport_state"] = (frozenset(keep), collapsed, merged)
+            built["viewport_stats"] = stats
+        return built["viewport_state"]
+
+    def _viewport_prune(self, built: dict):
+        # Elements that aren't rendered are dropped together with their subtree, unless something
+        # inside is rendered (e.g. display: contents). Subtrees lying entirely outside the viewport
+        # are collapsed into their top element, and runs of such siblings (the rows of a long list)
+        # into a single note. Elements without a box are treated as on-screen
+        width, height = built["viewport"]
+        geometry = built["geometry"]
+        elements = list(built["tags"].values())  # Preorder, so reversed it visits children first
+
+        def off_screen(rect):
+            x, y, w, h = rect
+            return x + w <= 0 or y + h <= 0 or x >= width or y >= height
+
+        rendered, all_off_screen, size = {}, {}, {}
+        for el in reversed(elements):
+            element_id = el["_element_id"]
+            box = geometry.get(element_id)
+            children = [c["_element_id"] for c in el.children if isinstance(c, Tag)]
+            shown = [c for c in children if rendered[c]]
+            self_rendered = box is None or box["visible"]
+
+            rendered[element_id] = self_rendered or bool(shown)
+            all_off_screen[element_id] = (
+                box is not None and (not self_rendered or off_screen(box["rect"]))
+                and all(all_off_screen[c] for c in shown)
+            )
+            size[element_id] = 1 + sum(size[c] for c in shown)
+
+        def where(element_id):
+            x, y, w, h = geometry[element_id]["rect"]
+            return "below" if y >= height else "above" if y + h <= 0 else "off-screen"
+
+        keep, collapsed, merged = set(), {}, {}
+        merged_count = 0
+        root = built["root"]
+        stack = [root]
+        while stack:
+            el = stack.pop()
+            element_id = el["_element_id"]
+            keep.add(element_id)
+            if el is not root and all_off_screen[element_id] and size[element_id] > 1:
+                collapsed[element_id] = size[element_id] - 1
+                continue
+
+            # Rendered children in order, consecutive off-screen ones grouped into runs
+            runs = []
+            for child in el.children:
+                if not isinstance(child, Tag) or not rendered[child["_element_id"]]:
+                    continue
+                off = all_off_screen[child["_element_id"]]
+                if off and runs and runs[-1][0]:
+                    runs[-1][1].append(child)
+                else:
+                    runs.append((off, [child]))
+            for off, run in runs:
+                if off and len(run) > 1:
+                    first = run[0]["_element_id"]
+                    count = sum(size[c["_element_id"]] for c in run)
+                    keep.add(first)
+                    merged[first] = merged_note(len(run), count, where(first))
+                    merged_count += count
+                else:
+                    stack.extend(run)
+
+        collapsed_count = sum(collapsed.values()) + merged_count
+        sent = len(keep) - len(merged)
+        stats = {
+            "elements": len(elements),
+            "sent": sent,
+            "hidden": len(elements) - sent - collapsed_count,
+            "collapsed": collapsed_count,
+        }
+        return keep, collapsed, merged, stats
+
+    def element_index(self, built: dict) -> DomIndex:
+        # Built once per parsed snapshot, so cache hits reuse it
+        if "index" not in built:
+            index = DomIndex()
+            for el in built["tags"].values():
+                fields = [own_text(el)]
+                for attr in INDEXED_ATTRIBUTES:
+                    value = el.get(attr)
+                    if value:
+                        fields.append(" ".join(value) if isinstance(value, list) else str(value))
+                index.add(el["_element_id"], " ".join(fields))
+            built["index"] = index
+        return built["index"]
+
+    def relevant_elements(self, built: dict, query: str, k: int) -> set:
+        # Top-k matches plus their ancestors for context, and their children and small sibling
+        # groups, which is usually where the clickable part of a matched label sits
+        matches = self.element_index(built).search(query, k)
+        if not matches:
+            return set()
+
+        by_id = {el["_element_id"]: el for el in built["tags"].values()}
+        keep = set()
+        for element_id, _ in matches:
+            el = by_id[element_id]
+            keep.update(c["_element_id"] for c in el.children if isinstance(c, Tag))
+            if el.parent is not None and el.parent.has_attr("_element_id"):
+                siblings = [c for c in el.parent.children if isinstance(c, Tag)]
+                if len(siblings) <= RELEVANCE_SIBLING_LIMIT:
+                    keep.update(c["_element_id"] for c in siblings)
+            while el is not None and el.has_attr("_element_id"):
+                if el["_element_id"] in keep and el is not by_id[element_id]:
+                    break
+                keep.add(el["_element_id"])
+                el = el.parent
+        return keep
+
+    def _diff_snapshots(self, previous: dict, current: dict, current_tags: dict) -> dict:
+        added, removed, changed = [], [], []
+
+        for key, (element_id, parent_key, signature) in current.items():
+            if key not in previous:
+                # Only report the root of each new subtree, its children come along with it
+                if parent_key in previous:
+                    added.append({
+                        "parent_id": current[parent_key][0],
+                        "element": current_tags[key],
+                    })
+            elif previous[key][2] != signature:
+                tag, attrs, text = signature
+                changed.append({
+                    "element_id": element_id,
+                    "parent_id": current[parent_key][0] if parent_key else None,
+                    "tag": tag,
+                    "attributes": dict(attrs),
+                    "text": text,
+                })
+
+        for key, (element_id, parent_key, _) in previous.items():
+            if key not in current and (parent_key is None or parent_key in current):
+                removed.append(element_id)
+
+        return {"added": added, "removed": removed, "changed": changed}
+
+    def _render_diff(self, changes: dict) -> str:
+        if self.dom_format == "compact":
+            lines = []
+            for entry in changes["added"]:
+                lines.append(f"+ under [{entry['parent_id']}]:")
+                lines.append(serialize_compact(entry["element"], depth=1))
+            lines += [f"- [{element_id}]" for element_id in changes["removed"]]
+            lines += [
+                "~ " + compact_line(entry["element_id"], entry["tag"], entry["attributes"], entry["text"])
+                for entry in changes["changed"]
+            ]
+            return "\n".join(lines) or "(no changes)"
+
+        for entry in changes["added"]:
+            entry["element"] = html_to_json.convert(str(entry["element"]))
+        return json.dumps(changes)
 
     
     def enter_fullscreen(self, scan_name: str) -> bool:
         try:
-            spans = self.driver.find_elements(By.CSS_SELECTOR, "span.view-label.mr5")
-            
-            for span in spans:
-                if scan_name.lower().strip() in span.text.lower().strip():
-                    parent_div = span.find_element(By.XPATH, "ancestor::div[contains(@class, 'orthographic-control-view')]")
-                    parent_div.find_element(By.CSS_SELECTOR, "i.mdi.mdi-fullscreen").click()
-
+            if not self.call_view("fullscreen", scan_name):
+                raise NoSuchElementException(f"No fullscreen button for {scan_name}")
             return "Command executed successfully" 
         except Exception as e:
             return f"Error occurred while trying to execute command, Error: {type(e).__name__}"
@@ -123,7 +962,7 @@ class LLMCommandParser:
             self.driver.get(url)
             
             # Wait until the document is fully loaded
-            time.sleep(3)
+            self.settler.wait_until_settled(timeout=10, label="goto")
 
             return "Command executed successfully"
         except Exception as e:
@@ -131,53 +970,49 @@ class LLMCommandParser:
 
     def move_slider(self, target_text: str, target_value: int, increment_mode: int, slides_per_sec: int):
         try:
-            xpath_conditions = [f"contains(text(), '{target_text.upper()}')"]
-            element_classes = ["view-label", "mr5"]
-            parent_div_classes = ["orthographic-control-view"]
-            xpath_conditions += [f"contains(@class, '{cls}')" for cls in element_classes]
-
-            xpath = f"//*[{ ' and '.join(xpath_conditions) }]"
-            element = self.driver.find_element(By.XPATH, xpath)
-
-            parent = element
-            while True:
-                parent = parent.find_element(By.XPATH, "..")
-                if parent.tag_name.lower() == "html":
-                    raise Exception("Matching parent <div> not found.")
-                if parent.tag_name.lower() == "div":
-                    parent_classes = parent.get_attribute("class").split()
-                    if all(cls in parent_classes for cls in parent_div_classes):
-                        break
-
-            input = parent.find_element(By.CSS_SELECTOR, "input.el-input__inner[type='text']")
-            current_value = int(input.get_attribute("value"))
-            sleep_time = 1 / (slides_per_sec - 1) if slides_per_sec != 1 else 1
-
-            if increment_mode == 0:
-                target_value = target_value - current_value
-
-            if target_value > 0:
-                button = parent.find_element(By.CSS_SELECTOR, "i.mdi.mdi-chevron-right")
-            else:
-                button = parent.find_element(By.CSS_SELECTOR, "i.mdi.mdi-chevron-left")
-
-            target_value = abs(target_value)
-
-            for i in range(target_value):
-                if keyboard.is_pressed('p'):
-                    print("🛑 Stopped slider movement due to 'p' key press.")
-                    break
-                button.click()
-                time.sleep(sleep_time)
-
-            return f"Slider action completed. {i + 1 if not keyboard.is_pressed('p') else i} steps performed."
+            started, state, stopped = self._run_slider(target_text, target_value, increment_mode, slides_per_sec, SLIDER_MODE)
+            steps = state["steps"] if state else 0
+
+            if SLIDER_MODE == "set" and not stopped and state and state["value"] != started["expected"]:
+                # The viewer ignored the typed value, click the rest of the way
+                started, state, stopped = self._run_slider(target_text, started["expected"], 0, slides_per_sec, "animate")
+                steps = state["steps"] if state else 0
+
+            current = state["value"] if state else None
+            if stopped:
+                return f"Slider stopped early. {steps} steps performed, current slice is {current}."
+            return f"Slider action completed. {steps} steps performed, current slice is {current}."
         except Exception as e:
             return f"Error occurred while trying to execute command, Error: {type(e).__name__}"
-        
+
+    def _run_slider(self, target_text, target_value, increment_mode, slides_per_sec, mode):
+        # The movement runs inside the page, Python only polls it and passes on a 'p' press
+        started = self.call_view("step", target_text, int(target_value), int(increment_mode), int(slides_per_sec), mode)
+        if "error" in started:
+            raise NoSuchElementException(started["error"])
+
+        steps = abs(started["expected"] - started["start"]) if mode == "animate" else 1
+        deadline = time.monotonic() + steps / max(int(slides_per_sec), 1) + SLIDER_DEADLINE_MARGIN
+
+        stopped = False
+        while True:
+            if not stopped and (keyboard.is_pressed('p') or keyboard.is_pressed('esc')):
+                print("🛑 Stopped slider movement due to key press.")
+                stopped = True
+            elif not stopped and time.monotonic() > deadline:
+                print("⚠️ Slider movement took too long, stopped it.")
+                stopped = True
+            state = self.viewer.call("stepState", stopped)
+            if state is None or state["done"]:
+                return started, state, stopped
+            if stopped and time.monotonic() > deadline + SLIDER_DEADLINE_MARGIN:
+                # The page doesn't even run the cancelled movement to an end
+                return started, state, stopped
+            time.sleep(SLIDER_POLL_INTERVAL)
+
     def get_coordinates(self, element_id: int):
         try:
-            selector = self.selector_map[element_id]
-            element = self.driver.find_element(By.CSS_SELECTOR, selector)
+            element = self.resolve_element(element_id)
             rect = element.rect
 
             x1 = int(rect['x'])
@@ -195,116 +1030,30 @@ class LLMCommandParser:
         print(f"direction {direction}")
         try:
             direction = direction.strip().lower()
-            supported_directions = {
-                "top left", "top right", "bottom left", "bottom right",
-                "center", "center top", "center bottom",
-                "middle left", "middle right"
-            }
-
-            if direction not in supported_directions:
+            # Failures carry the usual error prefix, so they count as errors and a routed zoom falls back to the model
+            if direction not in ZOOM_ORIGINS:
                 return (
-                    f"Unsupported direction: '{direction}'. "
-                    f"Please choose one of: {sorted(supported_directions)}"
+                    f"Error occurred while trying to execute command, Error: Unsupported direction: '{direction}'. "
+                    f"Please choose one of: {sorted(ZOOM_ORIGINS)}"
                 )
 
-            # Step 1: Find the canvas for the given scan
-            spans = self.driver.find_elements(By.CSS_SELECTOR, "span.view-label.mr5")
-            element = None
-
-            for span in spans:
-                if scan_name.lower().strip() in span.text.lower().strip():
-                    parent_div = span.find_element(
-                        By.XPATH, "ancestor::div[contains(@class, 'orthographic-control-view')]"
-                    )
-                    element = parent_div.find_element(By.CSS_SELECTOR, "canvas")
-                    break
-
-            if not element:
-                return f"Canvas for scan '{scan_name}' not found."
-
-            if element.tag_name.lower() != "canvas":
-                return "Target element is not a canvas, zoom aborted."
-
-            # Step 2: Get canvas coordinates
-            rect = element.rect
-            left = int(rect['x'])
-            top = int(rect['y'])
-            width = int(rect['width'])
-            height = int(rect['height'])
-
-            # Step 3: Compute (client_x, client_y) based on direction
-            if direction == "top left":
-                client_x = left + int(width * 0.05)
-                client_y = top + int(height * 0.10)
-            elif direction == "top right":
-                client_x = left + int(width * 0.95)
-                client_y = top + int(height * 0.10)
-            elif direction == "bottom left":
-                client_x = left + int(width * 0.05)
-                client_y = top + int(height * 0.90)
-            elif direction == "bottom right":
-                client_x = left + int(width * 0.95)
-                client_y = top + int(height * 0.90)
-            elif direction == "center":
-                client_x = left + int(width * 0.5)
-                client_y = top + int(height * 0.5)
-            elif direction == "center top":
-                client_x = left + int(width * 0.5)
-                client_y = top + int(height * 0.10)
-            elif direction == "center bottom":
-                client_x = left + int(width * 0.5)
-                client_y = top + int(height * 0.90)
-            elif direction == "middle left":
-                client_x = left + int(width * 0.05)
-                client_y = top + int(height * 0.5)
-            elif direction == "middle right":
-                client_x = left + int(width * 0.95)
-                client_y = top + int(height * 0.5)
-            else:
-                return f"Direction logic error for: {direction}"
-
-
-            # Step 4: Inject and run smoothZoom JavaScript
-            zoom_js = """
-                function smoothZoom(element, targetZoom, clientX, clientY, duration = 200) {
-                    const rect = element.getBoundingClientRect();
-                    const offsetX = clientX - rect.left;
-                    const offsetY = clientY - rect.top;
-                    let startZoom = parseFloat(element.dataset.zoom) || 1;
-                    let startTime = null;
-                    element.style.transformOrigin = `${offsetX}px ${offsetY}px`;
-                    function animateZoom(timestamp) {
-                        if (!startTime) startTime = timestamp;
-                        const elapsed = timestamp - startTime;
-                        const progress = Math.min(elapsed / duration, 1);
-                        const eased = progress < 0.5
-                            ? 2 * progress * progress
-                            : -1 + (4 - 2 * progress) * progress;
-                        const currentZoom = startZoom + (targetZoom - startZoom) * eased;
-                        element.style.transform = `scale(${currentZoom})`;
-                        if (progress < 1) {
-                            requestAnimationFrame(animateZoom);
-                        } else {
-                            element.dataset.zoom = currentZoom;
-                        }
-                    }
-                    requestAnimationFrame(animateZoom);
-                }
-                smoothZoom(arguments[0], arguments[1], arguments[2], arguments[3]);
-            """
-
-            self.driver.execute_script(zoom_js, element, target_zoom, client_x, client_y)
+            origin_x, origin_y = ZOOM_ORIGINS[direction]
+            try:
+                zoomed = self.call_view("zoom", scan_name, float(target_zoom), origin_x, origin_y)
+            except NoSuchElementException:
+                zoomed = False
+            if not zoomed:
+                return f"Error occurred while trying to execute command, Error: Canvas for scan '{scan_name}' not found."
             return "Zoom command executed successfully"
 
         except Exception as e:
-            return f"Error occurred while trying to zoom. Error: {type(e).__name__}: {str(e)}"
+            return f"Error occurred while trying to execute command, Error: {type(e).__name__}: {str(e)}"
 
 
     # Core Action: Click element by selector
     def click(self, element_id: int):
         try:
-            selector = self.selector_map[element_id]
-            element = self.driver.find_element(By.CSS_SELECTOR, selector)
+            element = self.resolve_element(element_id)
             element.click()
             return "Command executed successfully"
         except Exception as e:
@@ -312,9 +1061,8 @@ class LLMCommandParser:
 
     # Core Action: Fill input field
     def fill(self, element_id: int, text: str):
-        selector = self.selector_map[element_id]
         try:
-            element = self.driver.find_element(By.CSS_SELECTOR, selector)
+            element = self.resolve_element(element_id)
             element.clear()
             element.send_keys(text)
             return "Command executed successfully"
@@ -334,17 +1082,15 @@ class LLMCommandParser:
 
     # Core Action: Extract text
     def extract(self, element_id: int):
-        selector = self.selector_map[element_id]
         try:
-            element = self.driver.find_element(By.CSS_SELECTOR, selector)
+            element = self.resolve_element(element_id)
             return element.text
         except Exception as e:
             return f"Error occurred while trying to execute command, Error: {type(e).__name__}"
         
     def press_enter(self, element_id: int):
-        selector = self.selector_map[element_id]
         try:
-            element = self.driver.find_element(By.CSS_SELECTOR, selector)
+            element = self.resolve_element(element_id)
             element.send_keys(Keys.ENTER)
             return "Command executed successfully"
         except Exception as e:
@@ -415,11 +1161,15 @@ class LLMCommandParser:
             # Extract only the arguments that method needs
             args = [command.get(arg) for arg in method_args.get(action, [])]
 
+            url_before = self.driver.current_url
+            if url_before != self.view_cache_url:
+                # Another page or study, its panes are different elements
+                self.invalidate_views()
+                self.view_cache_url = url_before
+
             # Call the method with extracted arguments
             result = method(*args)
 
-            current_page_html = self.page_source_parser(self.driver.page_source)
-
             if len(self.driver.window_handles) > 1:
                 current = self.driver.current_window_handle
                 all_tabs = self.driver.window_handles
@@ -436,20 +1186,19 @@ class LLMCommandParser:
 
                 # Switch back to the new tab (since old one is closed)
                 self.driver.switch_to.window(new_tab)
-                time.sleep(5)
-            
-            script = """
-            document.querySelectorAll("input, textarea, select").forEach(el => {
-                if (el.tagName.toLowerCase() === "select") {
-                    el.setAttribute("data-value", el.options[el.selectedIndex]?.text || "");
-                } else {
-                    el.setAttribute("data-value", el.value || "");
-                }
-            });
-            """
-            self.driver.execute_script(script)
+                self.settler.wait_until_settled(timeout=10, label="new tab")
+
+            self.settler.wait_until_settled(
+                postcondition=self._postcondition(action, command, url_before), label=action
+            )
 
-            time.sleep(1.5)
+            # Form values are kept in data-value by the in-page form sync that page_version installs.
+            # Parse the settled page once, the next capture_dom call reuses it from the snapshot cache.
+            # A page that can't be captured right now (mid-navigation, no body yet) doesn't undo the action
+            try:
+                self.capture_dom(update_base=False)
+            except Exception as e:
+                print(f"⚠️ Could not capture the page after {action}: {type(e).__name__}")
 
 
             return result
@@ -459,6 +1208,25 @@ class LLMCommandParser:
         except Exception as e:
             print(f"❌ Error during execution: {e}")
 
+    def _postcondition(self, action: str, command: dict, url_before: str):
+        # Extra condition an action must meet before the page counts as settled
+        if action == "fill" and command.get("element_id") in self.selector_map:
+            try:
+                element = self.resolve_element(command.get("element_id"))
+            except Exception:
+                return None
+            return lambda: element.get_attribute("value") == command.get("text")
+        if action == "navigate":
+            return lambda: self.driver.current_url != url_before
+        if action == "switch_tab":
+            handles = self.driver.window_handles
+            index = command.get("index")
+            if not isinstance(index, int) or not -len(handles) <= index < len(handles):
+                # switch_tab already failed, there is no tab to wait for
+                return None
+            return lambda: self.driver.current_window_handle == self.driver.window_handles[index]
+        return None
+
     # Cleanup
     def close(self):
         self.driver.quit()
@@ -1,16 +1,22 @@
 import json
 import os
 import platform
+import re
 import subprocess
 import threading
 from dotenv import load_dotenv
 from openai import OpenAI
 from llm_command_parser import LLMCommandParser
+from command_router import CommandRouter
+from session_history import SessionHistory, compact_command
+from stage_timer import StageTimer
 import time
 import itertools
 import sys
 from contextlib import contextmanager, redirect_stdout
-from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from queue import Empty, Queue
 import keyboard
 import io
 
@@ -68,21 +74,59 @@ MODEL_NAME = os.getenv("MODEL")
 BROWSER_START_URL = "https://app.supervisely.com/"
 # BROWSER_START_URL = "https://app.supervisely.com/app/volumes/?datasetId=1059758&volumeId=358377319"
 CHROME_USER_DATA = r"C:\Users\Praveen\Desktop\Work\voice_command_agent_for_radiologist_final_project\profile"
+INCREMENTAL_DOM = True  # After the first step of a task, send only DOM changes to the model
+DOM_FORMAT = "compact"  # "compact" (one element per line) or "json" (html_to_json dump)
+DOM_BACKEND = "soup"  # "soup" (parse page_source in Python) or "browser" (prune inside the page)
+DOM_TOP_K = 60  # On large pages send only the elements most relevant to the request, 0 sends everything
+VIEWPORT_PRUNING = True  # Drop elements that aren't rendered and collapse off-screen subtrees, unless DOM_TOP_K already cut the snapshot
+STREAM_LLM = True  # Execute each action as soon as the model has finished writing it
+FAST_PATH_ROUTER = True  # Handle plain slider/zoom/fullscreen commands without the model
+
+# Token caps for the per-step prompt sections
+PROMPT_BUDGET = {
+    "prompt_history": 500,
+    "command_history": 2000,
+    "dom": 24000,
+}
+COMMAND_RESULT_CHARS = 300  # Longer command results (e.g. extracted text) are cut to this
+PROMPT_HISTORY_WINDOW = 20  # Previous requests kept verbatim, older ones are summarized
+
+DOM_FORMAT_NOTES = {
+    "json": "html_to_json output, every element's `_attributes` contain its `_element_id`",
+    "compact": 'one element per line as `[element_id] tag attribute=value "text"`, indentation shows nesting',
+}
+
+DOM_DIFF_NOTES = {
+    "json": (
+        '- "added": new subtrees, each attached under the element with `parent_id`\n'
+        '    - "removed": `element_id`s that no longer exist on the page\n'
+        '    - "changed": elements whose attributes or text changed, shown with their new values'
+    ),
+    "compact": (
+        "- `+ under [P]:` is followed by a new indented subtree attached under element P\n"
+        "    - `- [N]` means element N no longer exists on the page\n"
+        "    - `~ [N] ...` shows the new attributes and text of a changed element"
+    ),
+}
+
+SYSTEM_PROMPT = (
+    "You control a web browser using JSON commands. Do not use natural language.\n"
+    'If the task appears to be completed already based on the DOM or last command result, return { "action": "done" } immediately. '
+    "Only take actions if you are confident they are still necessary."
+)
 
 # --- Init ---
-prompt_history = []
+prompt_history = SessionHistory(window=PROMPT_HISTORY_WINDOW)
 stop_requested = False  # Global flag to break loop
 
 
-def build_prompt(prompt_history, command_history, url, page_data, user_request="", CURRENT_FULLSCREEN_SCAN=""):
-    prompt = f"""
+@lru_cache(maxsize=None)
+def build_instructions(dom_format="json"):
+    # Static part of every prompt. It must stay byte-identical across steps so the provider can cache it,
+    # anything that changes per step belongs in build_prompt
+    instructions = f"""
     You are a browser automation assistant. Your goal is to complete the **user's request** by returning one or more browser actions in the correct order.
-
-    🧑‍💻 User's Request:
-    {user_request}
-
-    📓 Previous User Prompts:
-    {json.dumps(prompt_history)}
+    The user's request, the current page and the DOM Snapshot are given in the next message.
 
     NOTE: link to supervisely is app.supervisely.com, you can select projects and datasets can by clicking the dataset name and start annotation by pressing the "annotate" after selecting the dataset. Don't press the three dots in dataset or projects
 
@@ -182,7 +226,7 @@ def build_prompt(prompt_history, command_history, url, page_data, user_request="
     ---
     📌 DOM Matching Requirements:
 
-    - Use only `element_id` values from `page_data`.
+    - Use only `element_id` values from `page_data`, the DOM Snapshot of each step.
     - Never guess or invent any selectors.
     - Each `element_id` corresponds internally to a real `_selector`.
 
@@ -256,6 +300,19 @@ def build_prompt(prompt_history, command_history, url, page_data, user_request="
 
         Use your understanding of spoken English patterns and correct formatting to infer the intended input accurately.
 
+    🧩 DOM Snapshot format: {DOM_FORMAT_NOTES[dom_format]}
+    """
+    return instructions
+
+
+def build_prompt(prompt_history, command_history, url, page_data, user_request="", CURRENT_FULLSCREEN_SCAN=""):
+    prompt = f"""
+    🧑‍💻 User's Request:
+    {user_request}
+
+    📓 Previous User Prompts:
+    {json.dumps(prompt_history)}
+
     ---
     🌐 Current Page URL:
     {url}
@@ -284,25 +341,277 @@ def build_prompt(prompt_history, command_history, url, page_data, user_request="
     return prompt
 
 
+def build_followup_prompt(command_history, url, page_data, CURRENT_FULLSCREEN_SCAN="", dom_format="json"):
+    prompt = f"""
+    Continue the same user's request. All instructions and rules above still apply.
+
+    🌐 Current Page URL:
+    {url}
+
+    📜 Command History (latest last):
+    {json.dumps(command_history)}
+
+    🧩 DOM Changes since the last snapshot:
+    {DOM_DIFF_NOTES[dom_format]}
+    Every `element_id` not listed here is unchanged and still valid.
+    {page_data}
+
+    Current Full Screen Scan: {CURRENT_FULLSCREEN_SCAN}
 
-def query_llm(prompt):
+    ⛔ Do NOT wrap your output in markdown. Return a raw JSON **list** of action objects, or the done action if the request is complete.
+    """
+    return prompt
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer():
+    # Loaded on first use (or in the background at startup), the encoding may have to be downloaded
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # Not installed, or the encoding can't be downloaded
+        return None
+
+
+def count_tokens(text):
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return len(text) // 4  # Rough estimate when tiktoken isn't installed
+    return len(tokenizer.encode(text))
+
+
+def fit_recent(items, cap):
+    # Keeps the newest items that fit in cap tokens, oldest ones are dropped first
+    kept = []
+    used = 0
+    for item in reversed(items):
+        tokens = count_tokens(json.dumps(item))
+        if used + tokens > cap:
+            break
+        kept.append(item)
+        used += tokens
+    kept.reverse()
+    return kept, {"tokens": used, "cap": cap, "dropped": len(items) - len(kept)}
+
+
+def fit_dom(page_data, cap, dom_format="json", user_request=""):
+    total = count_tokens(page_data)
+    if total <= cap or dom_format != "compact":
+        # The json dump can't lose elements without breaking its structure, so it is only measured
+        return page_data, {"tokens": total, "cap": cap, "dropped": 0}
+
+    lines = page_data.split("\n")
+    line_tokens = [count_tokens(line) for line in lines]
+
+    # Parent of each line from its indentation, so kept elements keep their ancestor context
+    parents = []
+    open_lines = []
+    for line in lines:
+        depth = (len(line) - len(line.lstrip(" "))) // 2
+        del open_lines[depth:]
+        parents.append(open_lines[-1] if open_lines else None)
+        open_lines.append(len(parents) - 1)
+
+    # Lines sharing words with the request go first, the rest follow in page order. Numbers
+    # ("volume 5", "row 42") only count as whole numbers, and not in the element's own [ID]
+    words = {word for word in re.findall(r"[a-z0-9]+", user_request.lower()) if len(word) > 2 or word.isdigit()}
+    numbers = {word for word in words if word.isdigit()}
+    words -= numbers
+    scores = []
+    for line in lines:
+        text = line.lower()
+        line_numbers = set(re.findall(r"\d+", re.sub(r"^\s*\[\d+\]", "", text)))
+        scores.append(sum(word in text for word in words) + len(numbers & line_numbers))
+    order = sorted(range(len(lines)), key=lambda i: (-scores[i], i))
+
+    keep = [False] * len(lines)
+    budget = cap
+    for i in order:
+        chain = []
+        node = i
+        while node is not None and not keep[node]:
+            chain.append(node)
+            node = parents[node]
+        cost = sum(line_tokens[node] for node in chain)
+        if cost > budget:
+            continue
+        for node in chain:
+            keep[node] = True
+        budget -= cost
+
+    dropped = keep.count(False)
+    kept_lines = [line for line, kept in zip(lines, keep) if kept]
+    kept_lines.append(f"… {dropped} elements omitted to fit the token budget")
+    return "\n".join(kept_lines), {"tokens": cap - budget, "cap": cap, "dropped": dropped}
+
+
+def fit_prompt_sections(prompt_history, command_history, page_data, user_request="", dom_format="json"):
+    usage = {"user_request": {"tokens": count_tokens(user_request), "cap": None, "dropped": 0}}
+    prompt_history, usage["prompt_history"] = fit_recent(prompt_history, PROMPT_BUDGET["prompt_history"])
+    command_history, usage["command_history"] = fit_recent(command_history, PROMPT_BUDGET["command_history"])
+    page_data, usage["dom"] = fit_dom(page_data, PROMPT_BUDGET["dom"], dom_format, user_request)
+    return prompt_history, command_history, page_data, usage
+
+
+def format_budget_usage(usage):
+    parts = []
+    for section, entry in usage.items():
+        part = f"{section.replace('_', ' ')} {entry['tokens']}"
+        if entry["cap"] is not None:
+            part += f"/{entry['cap']}"
+        if entry["dropped"]:
+            part += f" ({entry['dropped']} dropped)"
+        parts.append(part)
+    return " | ".join(parts)
+
+
+def assemble_prompt(conversation, dom_format="json", with_stats=True):
+    # Static prefix first, then the per-step conversation, so every request of a session shares the prefix
+    prefix = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": build_instructions(dom_format)},
+    ]
+    messages = prefix + conversation
+
+    if not with_stats:
+        return messages, None
+    return messages, prompt_token_stats(messages, len(prefix))
+
+
+def prompt_token_stats(messages, prefix_length):
+    prefix_tokens = sum(count_tokens(message["content"]) for message in messages[:prefix_length])
+    return {
+        "prefix_tokens": prefix_tokens,
+        "total_tokens": prefix_tokens + sum(count_tokens(message["content"]) for message in messages[prefix_length:]),
+    }
+
+
+def query_llm(messages):
     response = client.chat.completions.create(
         model=MODEL_NAME,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You control a web browser using JSON commands. Do not use natural language.\n"
-                    'If the task appears to be completed already based on the DOM or last command result, return { "action": "done" } immediately. '
-                    "Only take actions if you are confident they are still necessary."
-                ),
-            },
-            {"role": "user", "content": prompt},
-        ],
+        messages=messages,
         temperature=0,
     )
     return response.choices[0].message.content.strip()
 
+
+class ActionStreamParser:
+    # Picks complete top-level JSON objects out of a streamed action list. Anything outside
+    # an object (the list brackets, commas, markdown fences) is skipped
+    def __init__(self):
+        self.current = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text):
+        actions = []
+        for char in text:
+            if self.depth == 0:
+                if char == "{":
+                    self.current = [char]
+                    self.depth = 1
+                continue
+
+            self.current.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    actions.append(json.loads("".join(self.current)))
+        return actions
+
+
+def parse_actions(llm_output, raw_output):
+    raw_output.append(llm_output)
+    try:
+        actions = json.loads(llm_output.strip().replace("```json", "").replace("```", ""))
+        if not isinstance(actions, list):
+            actions = [actions]
+        return actions
+    except Exception as e:
+        print(f"\n❌ Failed to parse LLM output: {e}")
+        return []
+
+
+def stream_actions(messages, raw_output, cancel_event=None):
+    stream = client.chat.completions.create(
+        model=MODEL_NAME,
+        messages=messages,
+        temperature=0,
+        stream=True,
+    )
+    parser = ActionStreamParser()
+    try:
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content or ""
+            raw_output.append(text)
+            try:
+                actions = parser.feed(text)
+            except json.JSONDecodeError as e:
+                print(f"\n❌ Failed to parse streamed action: {e}")
+                return
+            yield from actions
+    finally:
+        stream.close()
+
+
+# The browser stays on the main thread, these workers only talk to the model and count tokens
+_executor = ThreadPoolExecutor(max_workers=2)
+_END_OF_ACTIONS = object()
+
+
+def start_llm_stage(messages, raw_output, cancel_event):
+    # Runs the model request in the background and hands over actions through a queue
+    actions = Queue()
+
+    def produce():
+        try:
+            if STREAM_LLM:
+                source = stream_actions(messages, raw_output, cancel_event)
+            else:
+                source = parse_actions(query_llm(messages), raw_output)
+            for action in source:
+                actions.put(action)
+        except Exception as e:
+            print(f"\n❌ LLM request failed: {e}")
+        finally:
+            actions.put(_END_OF_ACTIONS)
+
+    _executor.submit(produce)
+    return actions
+
+
+def iter_actions(actions, cancel_event, timer):
+    # Waits for the next action without blocking the ESC hotkey, time spent here is the model on the critical path
+    while not stop_requested:
+        start = time.perf_counter()
+        try:
+            action = actions.get(timeout=0.1)
+        except Empty:
+            timer.add("llm wait", time.perf_counter() - start)
+            continue
+        timer.add("llm wait", time.perf_counter() - start)
+        if action is _END_OF_ACTIONS:
+            return
+        yield action
+    cancel_event.set()
+
 stop_requested = False
 
 def stop_task():
@@ -318,12 +627,17 @@ def _play_sound(sound_file):
         subprocess.Popen(['afplay', sound_file])  # macOS
 
 
-def main(main_queue: Queue):
+def main(main_queue: Queue, started_at=None):
     global stop_requested, CURRENT_FULLSCREEN_SCAN
     
     keyboard.add_hotkey("esc", stop_task)
     task_queue = main_queue
-    agent = LLMCommandParser(url=BROWSER_START_URL, usr_dir=CHROME_USER_DATA)
+    # The tokenizer loads while Chrome starts
+    _executor.submit(get_tokenizer)
+    agent = LLMCommandParser(url=BROWSER_START_URL, usr_dir=CHROME_USER_DATA, dom_format=DOM_FORMAT, dom_backend=DOM_BACKEND, top_k=DOM_TOP_K, viewport_pruning=VIEWPORT_PRUNING)
+    router = CommandRouter()
+    since_start = f", ready {time.time() - started_at:.2f}s after launch" if started_at else ""
+    print(f"🚀 Browser startup: {agent.startup_timer.summary()}{since_start}")
     error_counter = 0
 
     # --- Main Loop ---
@@ -340,7 +654,18 @@ def main(main_queue: Queue):
                 done = False
                 stop_requested = False
                 command_history = []
-                prompt_history.append(task)
+                conversation = []
+                prompt_history.add(task)
+                agent.reset_snapshot()
+                agent.settler.reset_stats()
+                timer = StageTimer()
+
+                routed_actions = router.route(task, CURRENT_FULLSCREEN_SCAN) if FAST_PATH_ROUTER else None
+                if routed_actions:
+                    print(
+                        f"🧭 Fast path: routed in {router.last_seconds * 1000:.1f}ms, "
+                        f"{router.served_fraction():.0%} of commands served without the model"
+                    )
 
                 while not done:
                     if stop_requested:
@@ -352,32 +677,65 @@ def main(main_queue: Queue):
                         break
 
 
-                    current_html = agent.driver.page_source
-                    dom_data = agent.page_source_parser(current_html)
-
-                    prompt = build_prompt(
-                        prompt_history=prompt_history,
-                        command_history=command_history,
-                        url=agent.driver.current_url,
-                        page_data=dom_data,
-                        user_request=task,
-                    )
+                    raw_output = []
+                    request_started = time.perf_counter()
+                    cancel_event = threading.Event()
+                    stats_future = None
+                    if routed_actions:
+                        actions = routed_actions
+                    else:
+                        with timer.stage("capture"):
+                            dom_data = agent.capture_dom(diff=INCREMENTAL_DOM and bool(conversation), query=task)
+                        if agent.last_relevant_count is not None:
+                            print(f"🎯 Sent {agent.last_relevant_count} relevant elements instead of the full page")
+                        if agent.last_viewport_stats is not None:
+                            pruned = agent.last_viewport_stats
+                            print(
+                                f"🔭 Viewport pruning: {pruned['sent']} of {pruned['elements']} elements sent, "
+                                f"{pruned['hidden']} hidden dropped, {pruned['collapsed']} off-screen collapsed"
+                            )
+                        changed_fields = agent.changed_fields()
+                        if changed_fields:
+                            print(f"✏️  Form fields changed since the last capture: {changed_fields}")
+
+                        with timer.stage("prompt"):
+                            step_prompt_history, step_command_history, dom_data, budget_usage = fit_prompt_sections(
+                                prompt_history.for_prompt(), command_history, dom_data, user_request=task, dom_format=agent.dom_format
+                            )
+                            print(f"🧮 Sections: {format_budget_usage(budget_usage)}")
+
+                            if agent.last_snapshot_mode == "diff":
+                                prompt = build_followup_prompt(
+                                    command_history=step_command_history,
+                                    url=agent.driver.current_url,
+                                    page_data=dom_data,
+                                    CURRENT_FULLSCREEN_SCAN=CURRENT_FULLSCREEN_SCAN,
+                                    dom_format=agent.dom_format,
+                                )
+                            else:
+                                # Full snapshot, start a fresh conversation around it
+                                conversation = []
+                                prompt = build_prompt(
+                                    prompt_history=step_prompt_history,
+                                    command_history=step_command_history,
+                                    url=agent.driver.current_url,
+                                    page_data=dom_data,
+                                    user_request=task,
+                                )
 
-                    llm_output = (
-                        query_llm(prompt).strip().replace("```json", "").replace("```", "")
-                    )
+                            conversation.append({"role": "user", "content": prompt})
+                            messages, _ = assemble_prompt(conversation, dom_format=agent.dom_format, with_stats=False)
 
-                    # print("\n\nLLM OUTPUT!", llm_output, "\n\n")
-                    try:
-                        actions = json.loads(llm_output)
-                        if not isinstance(actions, list):
-                            actions = [actions]
-                    except Exception as e:
-                        print(f"\n❌ Failed to parse LLM output: {e}")
-                        print(f"🧾 Raw output:\n{llm_output}")
-                        break
+                        # Token counting runs next to the request instead of in front of it
+                        stats_future = _executor.submit(prompt_token_stats, messages, len(messages) - len(conversation))
+                        actions = iter_actions(start_llm_stage(messages, raw_output, cancel_event), cancel_event, timer)
 
+                    action_count = 0
                     for action in actions:
+                        action_count += 1
+                        if action_count == 1:
+                            print(f"⚡ First action ready after {time.perf_counter() - request_started:.2f}s")
+
                         if action.get("action", "").lower() == "done":
                             done = True
                             break
@@ -390,7 +748,7 @@ def main(main_queue: Queue):
                         def get_status():
                             return result_container["result"]
 
-                        with spinner(
+                        with timer.stage("execute"), spinner(
                             f"🤖 Executing: {action.get('intend', action['action'])} {"Press p to stop slider" if action.get('action', action['action']) == "move_slider" else ""}",
                             status_getter=get_status,
                         ):
@@ -403,10 +761,14 @@ def main(main_queue: Queue):
                                 print("Some error happened!")
                                 result = "Error occurred while trying to execute command"
                                 print(f"\nResults is {result}, {e}")
-                            result_container["result"] = result or ""
+                            if result is None:
+                                # parse_and_execute gives None when the action couldn't run at all
+                                result = "Error occurred while trying to execute command, Error: no result"
+                            result_container["result"] = result
 
 
-                        command_history.append({"command": action, "result": result})
+                        print(f"⏳ Page settled in {agent.settler.last_wait:.2f}s")
+                        command_history.append(compact_command(action, result, COMMAND_RESULT_CHARS))
 
                         if "Error occurred while trying to execute command".lower() in result.lower():
                             _play_sound(error_sound)
@@ -415,13 +777,50 @@ def main(main_queue: Queue):
                             _play_sound(step_sucess_sound)
                             error_counter = 0
 
-                    time.sleep(1.2)
+                    # Stops the model stream if the loop ended early, e.g. on done
+                    cancel_event.set()
+
+                    if routed_actions:
+                        # Hand the task to the model only if the fast path failed
+                        done = error_counter == 0
+                        routed_actions = None
+                        continue
+
+                    if stop_requested:
+                        continue
+
+                    if stats_future is not None:
+                        prompt_stats = stats_future.result()
+                        print(f"🧮 Prompt: {prompt_stats['total_tokens']} tokens, {prompt_stats['prefix_tokens']} cacheable prefix")
+
+                    llm_output = "".join(raw_output)
+                    conversation.append({"role": "assistant", "content": llm_output})
+
+                    if action_count == 0:
+                        print("\n❌ No actions found in LLM output")
+                        print(f"🧾 Raw output:\n{llm_output}")
+                        break
 
                 if error_counter < ERROR_THRESHOLD and not stop_requested:
                     _play_sound(sucess_sound)
                     print(f"✅ {task} — Task Completed!\n")
                 error_counter = 0
 
+                cache_stats = agent.snapshot_cache_stats()
+                print(f"📦 DOM snapshot cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+                print(f"⏳ Waited {agent.settler.total_wait():.2f}s in total for pages to settle")
+                print(f"⏱️ Critical path: {timer.summary()}")
+                lookups = agent.lookup_stats
+                print(
+                    f"🎯 Element lookups: {lookups['direct']} direct, {lookups['fallback']} by selector, "
+                    f"{lookups['stale']} stale, {lookups['seconds']:.2f}s total"
+                )
+                views = agent.view_cache_stats
+                print(
+                    f"🖼️ View handle cache: {views['hits']} hits, {views['misses']} misses, "
+                    f"{views['invalidations']} invalidations"
+                )
+
     except KeyboardInterrupt:
         print("\n👋 Exiting automation.")
 
@@ -1,21 +1,36 @@
-import audio_handler
-import llm_handler
+import time
 from multiprocessing import Process, Queue
 
 
+def run_llm(task_queue, started_at):
+    # Imported in the child only, so it doesn't also load the audio side (and torch) on spawn
+    import llm_handler
+    llm_handler.main(task_queue, started_at)
+
+
 def main():
+    started_at = time.time()
     print("Starting program")
 
     task_queue = Queue()
 
-    llm = Process(target=llm_handler.main, args=(task_queue,))
+    # The browser starts in the LLM process while the speech model loads here
+    llm = Process(target=run_llm, args=(task_queue, started_at))
     llm.start()
 
+    import_start = time.perf_counter()
+    import audio_handler
+    import_seconds = time.perf_counter() - import_start
+
     audio_listner_instance = audio_handler.AudioHandler(task_queue)
+    print(
+        f"🚀 Audio startup: imports {import_seconds:.2f}s | {audio_listner_instance.startup_timer.summary()}, "
+        f"ready {time.time() - started_at:.2f}s after launch"
+    )
 
     audio_listner_instance.listen_for_audio()
 
     llm.join()
 
 if "__main__" == __name__:
-    main()
\ No newline at end of file
+    main()
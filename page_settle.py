@@ -0,0 +1,136 @@
+import time
+
+
+# Installs network and mutation tracking once per document and reports how busy the page is.
+# Requests running for more than arguments[0] ms (long polls, event streams) don't count as in flight
+SETTLE_STATE_JS = """
+if (!window.__agentSettle) {
+    const state = { requests: new Map(), nextRequest: 0, lastActivity: performance.now() };
+    const touch = () => { state.lastActivity = performance.now(); };
+
+    new MutationObserver(touch).observe(document, {
+        subtree: true, childList: true, attributes: true, characterData: true,
+    });
+
+    const originalFetch = window.fetch;
+    if (originalFetch) {
+        window.fetch = function (...args) {
+            const id = state.nextRequest++;
+            state.requests.set(id, performance.now());
+            touch();
+            return originalFetch.apply(this, args).finally(() => { state.requests.delete(id); touch(); });
+        };
+    }
+
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function (...args) {
+        const id = state.nextRequest++;
+        state.requests.set(id, performance.now());
+        touch();
+        this.addEventListener("loadend", () => { state.requests.delete(id); touch(); }, { once: true });
+        return originalSend.apply(this, args);
+    };
+
+    window.__agentSettle = state;
+}
+const state = window.__agentSettle;
+const now = performance.now();
+let inflight = 0;
+for (const started of state.requests.values()) {
+    if (now - started < arguments[0]) inflight++;
+}
+return {
+    readyState: document.readyState,
+    inflight: inflight,
+    quietMs: now - state.lastActivity,
+};
+"""
+
+
+class PageSettler:
+    # A loaded page that never goes quiet (a viewer ticking its DOM, requests in flight all the time)
+    # counts as settled enough after busy_cap seconds, which is what the old fixed sleep waited.
+    # A postcondition that still fails once the page is idle gets postcondition_grace seconds more
+    def __init__(self, driver, quiet_ms: int = 300, poll_interval: float = 0.1, max_request_ms: int = 2000,
+                 busy_cap: float = 1.5, postcondition_grace: float = 0.5, clock=time.monotonic, sleep=time.sleep):
+        self.driver = driver
+        self.quiet_ms = quiet_ms
+        self.poll_interval = poll_interval
+        self.max_request_ms = max_request_ms
+        self.busy_cap = busy_cap
+        self.postcondition_grace = postcondition_grace
+        self.clock = clock
+        self.sleep = sleep
+
+        self.last_wait = 0.0
+        self.last_outcome = None
+        # (label, seconds waited, outcome), outcome is "settled", "busy" (settled enough after
+        # busy_cap), "unmet" (idle page, postcondition never held) or "timeout"
+        self.waits = []
+
+    def reset_stats(self):
+        self.last_wait = 0.0
+        self.last_outcome = None
+        self.waits = []
+
+    def total_wait(self) -> float:
+        return sum(seconds for _, seconds, _ in self.waits)
+
+    def page_state(self):
+        try:
+            return self.driver.execute_script(SETTLE_STATE_JS, self.max_request_ms)
+        except Exception:
+            # The page may be mid-navigation, try again on the next poll
+            return None
+
+    def is_settled(self, state) -> bool:
+        return (
+            state is not None
+            and state["readyState"] == "complete"
+            and state["inflight"] == 0
+            and state["quietMs"] >= self.quiet_ms
+        )
+
+    def wait_until_settled(self, timeout: float = 5.0, postcondition=None, label: str = "") -> bool:
+        # Polls until the document is loaded, the network is idle, the DOM has been quiet for
+        # quiet_ms and the optional postcondition holds. Returns True when it did, or when a loaded
+        # page stayed busy for busy_cap seconds. timeout only bounds pages that are still loading
+        start = self.clock()
+        idle_since = None  # Since when the page has been settled while the postcondition failed
+        while True:
+            state = self.page_state()
+            elapsed = self.clock() - start
+            if self.is_settled(state):
+                outcome = "settled"
+            elif state is not None and state["readyState"] == "complete" and elapsed >= self.busy_cap:
+                outcome = "busy"
+            else:
+                outcome = None
+
+            if outcome is not None:
+                if self._check(postcondition):
+                    break
+                # Nothing is happening on the page anymore, so nothing is going to make it hold
+                idle_since = self.clock() if idle_since is None else idle_since
+                if self.clock() - idle_since >= self.postcondition_grace:
+                    outcome = "unmet"
+                    break
+            else:
+                idle_since = None
+            if elapsed >= timeout:
+                outcome = "timeout"
+                break
+            self.sleep(self.poll_interval)
+
+        self.last_wait = self.clock() - start
+        self.last_outcome = outcome
+        self.waits.append((label, self.last_wait, outcome))
+        return outcome in ("settled", "busy")
+
+    def _check(self, postcondition) -> bool:
+        if postcondition is None:
+            return True
+        try:
+            return bool(postcondition())
+        except Exception:
+            return False
@@ -0,0 +1,50 @@
+import re
+from collections import Counter, deque
+
+
+def compact_command(action: dict, result, result_chars: int = 300) -> dict:
+    # Only what the model needs to avoid repeating itself: the action and its arguments, and a
+    # short result. "intend" is the model's own narration and just costs tokens on the way back
+    command = {k: v for k, v in action.items() if k != "intend"}
+    result = "" if result is None else str(result)
+    if len(result) > result_chars:
+        result = result[:result_chars] + "…"
+    return {"command": command, "result": result}
+
+
+class SessionHistory:
+    # Previous user requests for the prompt: the newest `window` verbatim, older ones folded into
+    # a one-line summary of how many there were and which kinds came up most
+    def __init__(self, window: int = 20, summary_kinds: int = 3, max_kinds: int = 200):
+        self.recent = deque(maxlen=window)
+        self.summary_kinds = summary_kinds
+        self.max_kinds = max_kinds
+        self.evicted = 0
+        self.kinds = Counter()
+
+    def __len__(self):
+        return self.evicted + len(self.recent)
+
+    def add(self, task: str):
+        if len(self.recent) == self.recent.maxlen:
+            self._compact(self.recent[0])
+        self.recent.append(task)
+
+    def _compact(self, task: str):
+        self.evicted += 1
+        # Numbers are dropped so "zoom axial 2x" and "zoom axial 3x" count as the same kind
+        kind = " ".join(re.sub(r"\d+(\.\d+)?", "#", task.lower()).split())
+        self.kinds[kind] += 1
+        if len(self.kinds) > self.max_kinds:
+            # Keep the counter bounded, the rarest kinds can't make the summary anyway
+            self.kinds = Counter(dict(self.kinds.most_common(self.max_kinds // 2)))
+
+    def summary(self) -> str:
+        if not self.evicted:
+            return ""
+        common = ", ".join(f'"{kind}" x{count}' for kind, count in self.kinds.most_common(self.summary_kinds))
+        return f"{self.evicted} earlier requests this session, most common: {common}"
+
+    def for_prompt(self) -> list:
+        summary = self.summary()
+        return ([summary] if summary else []) + list(self.recent)
@@ -0,0 +1,74 @@
+import threading
+import time
+import numpy as np
+
+
+SAMPLE_RATE = 16000  # What process_audio_data hands back
+TRANSCRIPTION_BACKENDS = {"whisper", "faster-whisper"}
+
+
+class WhisperBackend:
+    # The original path: Push2Type's Whisper model on CPU in float32. Imported here, since torch
+    # and Whisper take seconds to import and the faster-whisper path doesn't need them
+    name = "whisper"
+
+    def __init__(self, model_name: str, threads: int = 0):
+        from Push2Type.transcription import load_model, transcribe_audio
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = load_model(model_name, use_gpu=False)
+        self._transcribe = transcribe_audio
+        # The worker can still be finishing one recording while the next one streams its chunks, and
+        # Whisper's kv-cache hooks live on the model, so only one transcription runs at a time
+        self.lock = threading.Lock()
+
+    def transcribe(self, audio_array) -> str:
+        with self.lock:
+            return self._transcribe(audio_array, self.model)
+
+
+class FasterWhisperBackend:
+    # CTranslate2 inference with int8 weights, several times faster than float32 on CPU
+    name = "faster-whisper"
+
+    def __init__(self, model_name: str, threads: int = 0, compute_type: str = "int8"):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=threads)
+        # Same as Whisper, one transcription at a time. segments is a lazy generator, so decoding
+        # happens while it's consumed and that has to stay inside the lock too
+        self.lock = threading.Lock()
+
+    def transcribe(self, audio_array) -> str:
+        # Commands are a few seconds long, greedy decoding without the previous-text prompt is enough
+        with self.lock:
+            segments, _ = self.model.transcribe(
+                audio_array, language="en", beam_size=1, condition_on_previous_text=False
+            )
+            return " ".join(segment.text.strip() for segment in segments)
+
+
+def load_backend(name: str, model_name: str, threads: int = 0, warm_up: bool = True):
+    if name not in TRANSCRIPTION_BACKENDS:
+        raise ValueError(f"Unknown transcription backend: {name}, choose one of {sorted(TRANSCRIPTION_BACKENDS)}")
+
+    if name == "faster-whisper":
+        try:
+            backend = FasterWhisperBackend(model_name, threads)
+        except ImportError:
+            print("⚠️  faster-whisper is not installed, falling back to Whisper")
+            backend = WhisperBackend(model_name, threads)
+    else:
+        backend = WhisperBackend(model_name, threads)
+
+    if warm_up:
+        # The first call pays for lazy initialization, do it now instead of on the first command
+        start = time.perf_counter()
+        backend.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32))
+        print(f"🔥 {backend.name} warmed up in {time.perf_counter() - start:.2f}s")
+    return backend
+
+
+def real_time_factor(seconds: float, audio_array) -> float:
+    duration = len(audio_array) / SAMPLE_RATE
+    return seconds / duration if duration else 0.0
@@ -0,0 +1,75 @@
+import sys
+from command_router import CommandRouter
+
+
+# Runs the fast-path router over the viewer commands it should serve (the move_slider, zoom and
+# enter_fullscreen examples of the prompt among them) and ones it must hand to the model:
+#   python test_command_router.py
+
+def slider(scan, value, mode, speed=1):
+    return {"action": "move_slider", "target_text": scan, "target_value": value, "increment_mode": mode, "slides_per_sec": speed}
+
+
+ROUTED = [
+    # The prompt's own move_slider examples
+    ("Increase Sagittal scan slider by 20, slider per second 3", slider("Sagittal", 20, 1, 3)),
+    ("Decrease Axial scan by 10", slider("Axial", -10, 1)),
+    ("Go to 30 slides in Coronal scan", slider("Coronal", 30, 0)),
+    ("increase axial by 10", slider("Axial", 10, 1)),
+    ("go to slide 30 on coronal", slider("Coronal", 30, 0)),
+    ("increase axial by 10 at 3 slides per second", slider("Axial", 10, 1, 3)),
+    ("increase axial by ten, speed of five per second", slider("Axial", 10, 1, 5)),
+    ("go to slide twenty five, three per second on coronal", slider("Coronal", 25, 0, 3)),
+    ("move axial to 40", slider("Axial", 40, 0)),
+    ("jump to slide 12 on sagittal", slider("Sagittal", 12, 0)),
+    ("set coronal 30", slider("Coronal", 30, 0)),
+    ("axial to 50", slider("Axial", 50, 0)),
+    ("move axial up by 5", slider("Axial", 5, 1)),
+    ("zoom axial to 2x center", {"action": "zoom", "scan_name": "Axial", "target_zoom": 2, "direction": "center"}),
+    ("zoom bottom right 1.5x on axial", {"action": "zoom", "scan_name": "Axial", "target_zoom": 1.5, "direction": "bottom right"}),
+    ("reset zoom on sagittal", {"action": "zoom", "scan_name": "Sagittal", "target_zoom": 1, "direction": "center"}),
+    ("fullscreen sagittal", {"action": "enter_fullscreen", "scan_name": "Sagittal"}),
+]
+
+# Unclear or out of grammar, these have to fall back to the model
+NOT_ROUTED = [
+    "increase sagittal scan slider by 20 slider per second 3",  # Which number is the speed?
+    "increase axial by 10, 3 per second 4",
+    "increase axial by 10 per second",
+    "increase axial by 10 per minute",
+    # "by" is a step, jumping there instead would land on the wrong slice
+    "move axial by 10",
+    "move the axial slider by 10",
+    "jump axial by 20",
+    "set axial by 10",
+    "increase axial to 30",
+    "axial by 10",
+    "go to axial by 10",
+    "increase axial by 10 and zoom top left 2x",
+    "open volume 5",
+    "zoom axial",
+]
+
+
+def check_router() -> bool:
+    router = CommandRouter()
+    failures = []
+    for text, expected in ROUTED:
+        actions = router.route(text)
+        got = None if actions is None else {k: v for k, v in actions[0].items() if k != "intend"}
+        if actions is None or len(actions) != 1 or got != expected:
+            failures.append(f"{text!r}: expected {expected}, got {got}")
+    for text in NOT_ROUTED:
+        actions = router.route(text)
+        if actions is not None:
+            failures.append(f"{text!r}: should go to the model, got {actions}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    print(f"{len(ROUTED) + len(NOT_ROUTED) - len(failures)} of {len(ROUTED) + len(NOT_ROUTED)} commands routed as expected, "
+          f"{router.served_fraction():.0%} served without the model")
+    return not failures
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_router() else 1)
@@ -0,0 +1,169 @@
+import sys
+from benchmark_selectors import synthetic_page
+from fake_driver import FakeDriver, offline_parser
+
+
+# Checks that the "browser" DOM backend (pruning inside the page) gives the same snapshot as the
+# "soup" backend (page_source through BeautifulSoup) on a fake driver. Runs on built-in pages plus
+# any saved HTML pages passed in:
+#   python test_dom_backends.py [saved_page.html ...]
+
+VOLUME_PAGE = """<!DOCTYPE html>
+<html lang="en"><head><title>Volumes</title><script>window.x = 1;</script></head>
+<body class="theme-light">
+  <div id="app">
+    <nav class="toolbar"><a href="/projects">Projects</a> / <span>CT Chest</span></nav>
+    <div class="filters">
+      <input type="text" class="el-input__inner" placeholder="Search volumes" value="lung">
+      <select name="sort"><option value="name">Name</option><option value="date" selected>Date</option></select>
+    </div>
+    <ul class="list-wrapper">
+      <li id="row"><span>Volume 1</span><button class="el-button">Delete A</button></li>
+      <li id="row"><span>Volume 2</span><button class="el-button">Delete B</button></li>
+      <li><span>Volume 3</span> <!-- archived --> <button>Delete C</button><svg><path d="M0"></path></svg></li>
+    </ul>
+    <div class="orthographic-control-view">
+      <span class="view-label mr5">Axial</span>
+      <canvas></canvas>
+      <i class="mdi mdi-chevron-left"></i><input class="el-input__inner" type="text" value="120"><i class="mdi mdi-chevron-right"></i>
+      <i class="mdi mdi-fullscreen"></i>
+    </div>
+    <p>Text <b>bold is pruned</b> around <span>kept</span> children</p>
+    <div style="display: none"><span>Hidden</span></div>
+  </div>
+</body></html>"""
+
+
+def capture(html: str, dom_backend: str):
+    parser = offline_parser(FakeDriver(html), dom_backend=dom_backend)
+    parser.capture_dom()
+    return parser
+
+
+def check_backends_match(label: str, html: str) -> bool:
+    soup = capture(html, "soup")
+    browser = capture(html, "browser")
+
+    problems = []
+    if soup.selector_map != browser.selector_map:
+        problems.append("selector_map differs")
+    soup_snapshot, browser_snapshot = soup.current_snapshot["snapshot"], browser.current_snapshot["snapshot"]
+    if soup_snapshot != browser_snapshot:
+        different = [key for key in soup_snapshot if soup_snapshot[key] != browser_snapshot.get(key)]
+        different += [key for key in browser_snapshot if key not in soup_snapshot]
+        problems.append(f"snapshot differs at {len(different)} elements, first {different[0]}: "
+                        f"soup {soup_snapshot.get(different[0])} vs browser {browser_snapshot.get(different[0])}")
+    if browser.driver.scripts.count("extract") != 1:
+        problems.append(f"browser backend ran {browser.driver.scripts} instead of a single extract call")
+
+    # Every element of the browser snapshot resolves straight from the registry, to the right tag
+    for element_id, position in browser.current_snapshot["live_index"].items():
+        element = browser._lookup_live_element(element_id)
+        expected = browser.current_snapshot["tags"]
+        if element is None or element.name != list(expected.values())[position].name:
+            problems.append(f"element {element_id} doesn't resolve from the live registry")
+            break
+
+    status = "✅ match" if not problems else "❌ " + "; ".join(problems)
+    print(f"{label}: {len(soup.selector_map)} elements, {status}")
+    return not problems
+
+
+def check_changed_fields(dom_backend: str) -> bool:
+    # Fields typed into between two captures come back from changed_fields() under the element IDs
+    # the model saw them with, and only until the capture after that
+    driver = FakeDriver(VOLUME_PAGE)
+    parser = offline_parser(driver, dom_backend=dom_backend)
+    parser.capture_dom()
+    ids = {el.get("placeholder") or el.get("name"): element_id
+           for element_id, el in ((el["_element_id"], el) for el in parser.current_snapshot["tags"].values())
+           if el.name in ("input", "select")}
+
+    live = driver.document
+    driver.type_into(live.find("input", placeholder="Search volumes"), "liver")
+    driver.type_into(live.find("select", attrs={"name": "sort"}), "Name")
+    rendered = parser.capture_dom()
+    expected = {ids["Search volumes"]: "liver", ids["sort"]: "Name"}
+    changed = parser.changed_fields()
+
+    parser.capture_dom()
+    after = parser.changed_fields()
+
+    problems = []
+    if changed != expected:
+        problems.append(f"changed_fields() gave {changed} instead of {expected}")
+    if "data-value=liver" not in rendered:
+        problems.append("the new snapshot doesn't show the typed value")
+    if after:
+        problems.append(f"{after} still reported a capture later")
+
+    status = "✅ match" if not problems else "❌ " + "; ".join(problems)
+    print(f"changed fields ({dom_backend}): {changed}, {status}")
+    return not problems
+
+
+def check_loading_page() -> bool:
+    # A document without a body yet gives both backends the same empty snapshot instead of an error
+    html = "<html><head><title>Loading</title></head></html>"
+    snapshots = {}
+    for dom_backend in ("soup", "browser"):
+        for viewport_pruning in (False, True):
+            parser = offline_parser(FakeDriver(html), dom_backend=dom_backend, viewport_pruning=viewport_pruning)
+            try:
+                rendered = parser.capture_dom()
+            except Exception as e:
+                print(f"❌ loading page: {dom_backend} backend raised {type(e).__name__}: {e}")
+                return False
+            snapshots[(dom_backend, viewport_pruning)] = (parser.current_snapshot["snapshot"], rendered)
+
+    ok = len({repr(snapshot) for snapshot in snapshots.values()}) == 1
+    rendered = snapshots[("soup", False)][1]
+    print(f"loading page: {rendered!r}, {'✅ match' if ok else '❌ backends differ: ' + repr(snapshots)}")
+    return ok
+
+
+def check_live_lookup(label: str, html: str) -> bool:
+    # Both backends register the live elements while capturing, so every element ID resolves to the
+    # element it was captured from, also after the page renamed classes (which breaks the selectors)
+    driver = FakeDriver(html)
+    browser = offline_parser(driver, dom_backend="browser")
+    browser.capture_dom()
+    browser_elements = {element_id: browser._lookup_live_element(element_id) for element_id in browser.selector_map}
+
+    driver.scripts = []
+    soup = offline_parser(driver, dom_backend="soup")
+    soup.capture_dom()
+    for el in driver.document.body.find_all(True):
+        if el.has_attr("class"):
+            el["class"] = ["renamed"]
+    soup_elements = {element_id: soup._lookup_live_element(element_id) for element_id in soup.selector_map}
+
+    problems = []
+    if driver.scripts[:2] != ["version", "source"]:
+        problems.append(f"soup capture ran {driver.scripts[:2]} instead of registering with the page source")
+    wrong = [element_id for element_id in soup_elements if soup_elements[element_id] is not browser_elements.get(element_id)]
+    if wrong:
+        problems.append(f"{len(wrong)} elements resolve differently, first [{wrong[0]}]")
+    if soup.lookup_stats["fallback"] or soup.lookup_stats["stale"]:
+        problems.append(f"lookups went past the registry: {soup.lookup_stats}")
+
+    status = "✅ match" if not problems else "❌ " + "; ".join(problems)
+    print(f"{label} live lookup: {len(soup_elements)} elements, {status}")
+    return not problems
+
+
+if __name__ == "__main__":
+    results = [
+        check_backends_match("volume page", VOLUME_PAGE),
+        check_backends_match("synthetic 300 rows", synthetic_page(300)),
+        check_live_lookup("volume page", VOLUME_PAGE),
+        check_live_lookup("synthetic 300 rows", synthetic_page(300)),
+        check_loading_page(),
+        check_changed_fields("soup"),
+        check_changed_fields("browser"),
+    ]
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+        results += [check_backends_match(path, html), check_live_lookup(path, html)]
+    sys.exit(0 if all(results) else 1)
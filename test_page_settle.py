@@ -0,0 +1,102 @@
+import sys
+from fake_driver import FakeDriver, offline_parser
+from page_settle import PageSettler
+from test_dom_backends import VOLUME_PAGE
+
+
+# Drives PageSettler through scripted page states on a fake clock, so each case runs instantly and
+# the reported waits are exact:
+#   python test_page_settle.py
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def settler_for(driver):
+    clock = FakeClock()
+    driver.clock = clock
+    return PageSettler(driver, clock=clock, sleep=clock.sleep)
+
+
+def quiet_page(driver, settler):
+    driver.last_activity = -1.0
+    return settler.wait_until_settled(label="quiet")
+
+
+def long_poll(driver, settler):
+    # Opened with the page long before the action and never answered
+    driver.last_activity = -1.0
+    driver.requests = [(-30.0, None)]
+    return settler.wait_until_settled(label="long poll")
+
+
+def fresh_request(driver, settler):
+    # Answered after 0.4s, like a real request the action caused
+    driver.requests = [(0.0, 0.4)]
+    driver.last_activity = 0.0
+    return settler.wait_until_settled(label="request")
+
+
+def ticking_dom(driver, settler):
+    driver.ticking = True
+    return settler.wait_until_settled(label="ticking")
+
+
+def still_loading(driver, settler):
+    driver.ready_state = "loading"
+    return settler.wait_until_settled(timeout=3.0, label="loading")
+
+
+def unmet_postcondition(driver, settler):
+    # A fill whose value the page reformatted, "5551234" came out as "555-1234"
+    driver.last_activity = -1.0
+    return settler.wait_until_settled(postcondition=lambda: "555-1234" == "5551234", label="fill")
+
+
+# (case, expected result, expected outcome, most seconds it may wait)
+CASES = [
+    (quiet_page, True, "settled", 0.0),
+    (long_poll, True, "settled", 0.0),
+    (fresh_request, True, "settled", 0.8),
+    (ticking_dom, True, "busy", 1.5),
+    (still_loading, False, "timeout", 3.0),
+    (unmet_postcondition, False, "unmet", 0.5),
+]
+
+
+def check_switch_tab() -> bool:
+    # An out of range tab has nothing to wait for, an existing one waits until it's current
+    driver = FakeDriver(VOLUME_PAGE)
+    driver.window_handles = ["first", "second"]
+    driver.current_window_handle = "first"
+    parser = offline_parser(driver)
+    out_of_range = parser._postcondition("switch_tab", {"action": "switch_tab", "index": 5}, "")
+    in_range = parser._postcondition("switch_tab", {"action": "switch_tab", "index": 1}, "")
+    ok = out_of_range is None and in_range is not None and not in_range()
+    print(f"switch_tab postcondition: {'✅' if ok else '❌'} out of range {out_of_range}, in range waits for the tab")
+    return ok
+
+
+def check_settler() -> bool:
+    ok = True
+    for case, expected, expected_outcome, most_seconds in CASES:
+        driver = FakeDriver(VOLUME_PAGE)
+        settler = settler_for(driver)
+        result = case(driver, settler)
+        passed = result == expected and settler.last_outcome == expected_outcome and settler.last_wait <= most_seconds + 1e-9
+        ok = ok and passed
+        print(f"{'✅' if passed else '❌'} {case.__name__}: {settler.last_outcome} after {settler.last_wait:.1f}s "
+              f"(expected {expected_outcome} within {most_seconds:.1f}s)")
+    return ok
+
+
+if __name__ == "__main__":
+    results = [check_settler(), check_switch_tab()]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,135 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from openai import OpenAI
+import llm_handler
+
+
+# Sends the prompts of a multi-step session to a local stand-in for the chat completions API and
+# checks that every request starts with the same static prefix, byte for byte, which is what
+# provider-side prompt caching keys on. No API key or network needed:
+#   python test_prompt_prefix.py
+
+DONE_REPLY = '[{"action": "done", "intend": "stand-in"}]'
+
+# (request, url, command history, DOM) of each step; steps after the first of a task send a diff
+SESSION = [
+    ("open volume 5", "https://app.supervisely.com/projects/1/datasets", [],
+     '[0] body idx=1\n  [1] ul class=list-wrapper idx=1\n    [2] li idx=1 "Volume 5"'),
+    ("open volume 5", "https://app.supervisely.com/projects/1/datasets",
+     [{"action": "click", "element_id": 2, "result": "Command executed successfully"}],
+     '+ under [1]:\n  [3] div class=viewer idx=2'),
+    ("increase axial by 10 and zoom top left 2x", "https://app.supervisely.com/volumes/5", [],
+     '[0] body idx=1\n  [4] canvas idx=1\n  [5] span class="view-label mr5" "Axial"'),
+    ("fullscreen sagittal", "https://app.supervisely.com/volumes/5",
+     [{"action": "move_slider", "target_text": "axial", "result": "Slider action completed. 10 steps performed, current slice is 130."}],
+     '~ [5] span class="view-label mr5" "Axial 130"'),
+]
+
+
+class StandInAPI(BaseHTTPRequestHandler):
+    # Minimal POST /v1/chat/completions, keeps every raw request body and always answers done
+    bodies = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        StandInAPI.bodies.append(body)
+        request = json.loads(body)
+
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for content in (DONE_REPLY[:10], DONE_REPLY[10:]):
+                chunk = {"id": "stand-in", "object": "chat.completion.chunk", "created": 0, "model": request["model"],
+                         "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        reply = json.dumps({
+            "id": "stand-in", "object": "chat.completion", "created": 0, "model": request["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": DONE_REPLY}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_session(dom_format: str, stream: bool):
+    # Builds each step's prompt the way llm_handler.main does and sends it off
+    sent = []
+    conversation = []
+    history = llm_handler.SessionHistory(window=llm_handler.PROMPT_HISTORY_WINDOW)
+    for task, url, command_history, dom in SESSION:
+        if command_history and conversation:
+            prompt = llm_handler.build_followup_prompt(command_history, url, dom, dom_format=dom_format)
+        else:
+            history.add(task)
+            conversation = []
+            prompt = llm_handler.build_prompt(history.for_prompt(), command_history, url, dom, user_request=task)
+        conversation.append({"role": "user", "content": prompt})
+
+        messages, stats = llm_handler.assemble_prompt(conversation, dom_format=dom_format)
+        raw_output = []
+        if stream:
+            list(llm_handler.stream_actions(messages, raw_output))
+        else:
+            llm_handler.parse_actions(llm_handler.query_llm(messages), raw_output)
+        conversation.append({"role": "assistant", "content": "".join(raw_output)})
+        sent.append((messages, stats))
+    return sent
+
+
+def check_prefix(dom_format: str, stream: bool) -> bool:
+    StandInAPI.bodies = []
+    sent = run_session(dom_format, stream)
+    received = [json.loads(body)["messages"] for body in StandInAPI.bodies]
+
+    problems = []
+    prefix_length = len(sent[0][0]) - 1  # Everything in front of the first step's user message
+    prefixes = [json.dumps(messages[:prefix_length], ensure_ascii=False).encode("utf-8") for messages in received]
+    if len(received) != len(SESSION):
+        problems.append(f"{len(received)} requests reached the stand-in instead of {len(SESSION)}")
+    elif any(prefix != prefixes[0] for prefix in prefixes):
+        problems.append("the static prefix changed between steps")
+
+    # The raw request bodies have to agree at least up to the end of the prefix too
+    shared = len(StandInAPI.bodies[0])
+    for body in StandInAPI.bodies[1:]:
+        differs_at = next((i for i, (a, b) in enumerate(zip(StandInAPI.bodies[0], body)) if a != b), len(body))
+        shared = min(shared, differs_at)
+    prefix_end = StandInAPI.bodies[0].find(b'"role":"user"')
+    if prefix_end < 0 or shared < prefix_end:
+        problems.append(f"raw request bodies diverge at byte {shared}, before the prefix ends")
+
+    prefix_tokens = {stats["prefix_tokens"] for _, stats in sent}
+    expected_tokens = sum(llm_handler.count_tokens(message["content"]) for message in received[0][:prefix_length])
+    if prefix_tokens != {expected_tokens}:
+        problems.append(f"reported cacheable prefix {sorted(prefix_tokens)} tokens, expected {expected_tokens}")
+
+    mode = "streamed" if stream else "single"
+    status = "✅ prefix identical" if not problems else "❌ " + "; ".join(problems)
+    print(f"{dom_format} / {mode}: {len(received)} requests, {expected_tokens} prefix tokens, "
+          f"{shared} shared request bytes, {status}")
+    return not problems
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llm_handler.client = OpenAI(base_url=f"http://127.0.0.1:{server.server_port}/v1", api_key="stand-in")
+    llm_handler.MODEL_NAME = "stand-in"
+
+    try:
+        results = [check_prefix(dom_format, stream) for dom_format in ("compact", "json") for stream in (False, True)]
+    finally:
+        server.shutdown()
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,75 @@
+import threading
+import time
+from queue import Full, Queue
+
+
+class TranscriptionWorker:
+    # A single background thread that runs transcription jobs in submission order, so the hotkey
+    # callbacks only hand over audio and return. The queue is bounded: when it is full, submit()
+    # refuses the job instead of letting a backlog of recordings build up
+    def __init__(self, max_pending: int = 4):
+        self.jobs = Queue(maxsize=max_pending)
+        self.metrics = {
+            "submitted": 0, "completed": 0, "failed": 0, "rejected": 0,
+            "max_depth": 0, "wait_seconds": 0.0, "run_seconds": 0.0,
+        }
+        self.last_wait = 0.0
+        self.last_run = 0.0
+        self.lock = threading.Lock()
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def depth(self) -> int:
+        return self.jobs.qsize()
+
+    def is_full(self) -> bool:
+        return self.jobs.full()
+
+    def submit(self, transcribe, deliver) -> bool:
+        # transcribe() produces the text, deliver(text) hands it on; both run on the worker thread
+        try:
+            self.jobs.put_nowait((time.perf_counter(), transcribe, deliver))
+        except Full:
+            with self.lock:
+                self.metrics["rejected"] += 1
+            return False
+
+        with self.lock:
+            self.metrics["submitted"] += 1
+            self.metrics["max_depth"] = max(self.metrics["max_depth"], self.jobs.qsize())
+        return True
+
+    def wait_until_idle(self):
+        self.jobs.join()
+
+    def _run(self):
+        while True:
+            submitted, transcribe, deliver = self.jobs.get()
+            started = time.perf_counter()
+            failed = False
+            try:
+                deliver(transcribe())
+            except Exception as e:
+                failed = True
+                print(f"❌ Transcription failed: {type(e).__name__}: {e}")
+            finally:
+                finished = time.perf_counter()
+                with self.lock:
+                    self.last_wait = started - submitted
+                    self.last_run = finished - started
+                    self.metrics["failed" if failed else "completed"] += 1
+                    self.metrics["wait_seconds"] += self.last_wait
+                    self.metrics["run_seconds"] += self.last_run
+                self.jobs.task_done()
+
+    def summary(self) -> str:
+        with self.lock:
+            metrics = dict(self.metrics)
+        done = metrics["completed"] + metrics["failed"]
+        average_wait = metrics["wait_seconds"] / done if done else 0.0
+        average_run = metrics["run_seconds"] / done if done else 0.0
+        return (
+            f"{done} done, {self.depth()} queued (max {metrics['max_depth']}), {metrics['rejected']} rejected, "
+            f"avg wait {average_wait:.2f}s, avg transcription {average_run:.2f}s"
+        )
@@ -0,0 +1,173 @@
+from selenium.common.exceptions import StaleElementReferenceException
+
+
+# Bump whenever VIEWER_HELPERS_JS changes, pages holding an older copy get the new one on next call
+VIEWER_HELPERS_VERSION = 3
+
+# Viewer helper library, defined once per document as window.__agentViewer
+VIEWER_HELPERS_JS = """
+window.__agentViewer = (() => {
+    const version = %d;
+
+    function getView(scan) {
+        const name = scan.trim().toLowerCase();
+        const span = [...document.querySelectorAll("span.view-label.mr5")]
+            .find(el => el.textContent.trim().toLowerCase().includes(name));
+        return span ? span.closest(".orthographic-control-view") : null;
+    }
+
+    // Everything the viewer actions touch in one view, so callers can keep it between actions
+    function handles(scan) {
+        const view = getView(scan);
+        if (!view) return null;
+        return {
+            view,
+            canvas: view.querySelector("canvas"),
+            input: view.querySelector("input.el-input__inner[type='text']"),
+            previous: view.querySelector("i.mdi.mdi-chevron-left"),
+            next: view.querySelector("i.mdi.mdi-chevron-right"),
+            fullscreen: view.querySelector("i.mdi.mdi-fullscreen"),
+        };
+    }
+
+    // Actions take either a scan name or the handles() of its view
+    const resolve = target => typeof target === "string" ? handles(target) : target;
+
+    // Next frame, or a timer when frames don't come: Chrome stops requestAnimationFrame in
+    // background and fully covered windows
+    function nextFrame(callback) {
+        let fired = false;
+        const run = () => {
+            if (fired) return;
+            fired = true;
+            callback(performance.now());
+        };
+        requestAnimationFrame(run);
+        setTimeout(run, 100);
+    }
+
+    function fullscreen(target) {
+        const button = resolve(target)?.fullscreen;
+        if (!button) return false;
+        button.click();
+        return true;
+    }
+
+    // fx/fy are the zoom origin as fractions of the canvas size
+    function zoom(target, targetZoom, fx, fy, duration = 200) {
+        const canvas = resolve(target)?.canvas;
+        if (!canvas) return false;
+
+        const rect = canvas.getBoundingClientRect();
+        const startZoom = parseFloat(canvas.dataset.zoom) || 1;
+        let startTime = null;
+        canvas.style.transformOrigin = `${rect.width * fx}px ${rect.height * fy}px`;
+        function animateZoom(timestamp) {
+            if (!startTime) startTime = timestamp;
+            const progress = Math.min((timestamp - startTime) / duration, 1);
+            const eased = progress < 0.5 ? 2 * progress * progress : -1 + (4 - 2 * progress) * progress;
+            const currentZoom = startZoom + (targetZoom - startZoom) * eased;
+            canvas.style.transform = `scale(${currentZoom})`;
+            if (progress < 1) {
+                requestAnimationFrame(animateZoom);
+            } else {
+                canvas.dataset.zoom = currentZoom;
+            }
+        }
+        requestAnimationFrame(animateZoom);
+        return true;
+    }
+
+    // Starts a slider movement and leaves its progress in window.__agentSlider for stepState().
+    // "animate" clicks the chevrons at perSecond, "set" types the target slice into the input
+    function step(target, targetValue, incrementMode, perSecond, mode) {
+        const view = resolve(target);
+        const input = view?.input;
+        if (!input) return { error: "Slider not found" };
+
+        const start = parseInt(input.value, 10);
+        if (Number.isNaN(start)) return { error: "Slider value not readable" };
+        const delta = incrementMode === 0 ? targetValue - start : targetValue;
+        const state = { input, cancel: false, done: false, steps: 0, total: Math.abs(delta) };
+        window.__agentSlider = state;
+
+        if (mode === "set") {
+            input.value = String(start + delta);
+            for (const type of ["input", "change"]) input.dispatchEvent(new Event(type, { bubbles: true }));
+            input.dispatchEvent(new KeyboardEvent("keyup", { key: "Enter", bubbles: true }));
+            state.steps = state.total;
+            // Give the viewer a couple of frames to re-render before the value is read back
+            nextFrame(() => nextFrame(() => { state.done = true; }));
+            return { start, expected: start + delta };
+        }
+
+        const button = delta > 0 ? view.next : view.previous;
+        if (!button) return { error: "Slider buttons not found" };
+
+        // Clicks whenever a step is due, several per frame if perSecond is above the frame rate
+        const interval = 1000 / Math.max(perSecond, 1);
+        const started = performance.now();
+        const tick = now => {
+            if (state.cancel || state.steps >= state.total) {
+                state.done = true;
+                return;
+            }
+            const due = Math.min(state.total, Math.floor((now - started) / interval) + 1);
+            while (state.steps < due) {
+                button.click();
+                state.steps++;
+            }
+            nextFrame(tick);
+        };
+        nextFrame(tick);
+        return { start, expected: start + delta };
+    }
+
+    // Reports the running slider movement, stopping it first when cancel is true
+    function stepState(cancel) {
+        const state = window.__agentSlider;
+        if (!state) return null;
+        if (cancel) state.cancel = true;
+        const value = parseInt(state.input.value, 10);
+        return { done: state.done, steps: state.steps, value: Number.isNaN(value) ? null : value };
+    }
+
+    return { version, getView, handles, fullscreen, zoom, step, stepState };
+})();
+""" % VIEWER_HELPERS_VERSION
+
+# Calls a helper, or reports that this document doesn't have the current library yet or that the
+# view handles passed in are no longer on the page
+CALL_VIEWER_JS = """
+const [version, name, args] = arguments;
+const viewer = window.__agentViewer;
+if (!viewer || viewer.version !== version) return { missing: true };
+if (args[0] && args[0].view && !args[0].view.isConnected) return { stale: true };
+return { value: viewer[name](...args) };
+"""
+
+
+class ViewerHelpers:
+    def __init__(self, driver):
+        self.driver = driver
+        self.injections = 0  # Lazy injections, i.e. documents the new-document hook didn't cover
+
+    def install(self):
+        # Registers the library for every document loaded from now on, so navigation doesn't lose it.
+        # The page that is already open is covered by the lazy injection in call()
+        try:
+            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": VIEWER_HELPERS_JS})
+            return True
+        except Exception:
+            # Not a Chromium driver, every document gets the library on first use instead
+            return False
+
+    def call(self, name: str, *args):
+        reply = self.driver.execute_script(CALL_VIEWER_JS, VIEWER_HELPERS_VERSION, name, list(args))
+        if reply.get("missing"):
+            self.injections += 1
+            self.driver.execute_script(VIEWER_HELPERS_JS)
+            reply = self.driver.execute_script(CALL_VIEWER_JS, VIEWER_HELPERS_VERSION, name, list(args))
+        if reply.get("stale"):
+            raise StaleElementReferenceException(f"View handles passed to {name} are no longer attached")
+        return reply["value"]